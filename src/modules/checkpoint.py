@@ -0,0 +1,75 @@
+import json
+import os
+import random
+
+import numpy as np
+
+CHECKPOINT_VERSION = 1
+
+
+def get_rng_state():
+    """Capture the state of both the `random` module and NumPy's global RNG."""
+    py_version, py_internal, py_gauss = random.getstate()
+    np_name, np_keys, np_pos, np_has_gauss, np_gauss = np.random.get_state()
+    return {
+        'python': (py_version, np.array(py_internal, dtype=np.uint32), py_gauss),
+        'numpy': (np_name, np.asarray(np_keys, dtype=np.uint32), int(np_pos), int(np_has_gauss), float(np_gauss)),
+    }
+
+
+def set_rng_state(state):
+    py_version, py_internal, py_gauss = state['python']
+    random.setstate((py_version, tuple(int(v) for v in py_internal), py_gauss))
+    np.random.set_state(state['numpy'])
+
+
+def save_checkpoint(path, arrays, params):
+    """Write simulation arrays, parameters and RNG state to a compressed .npz file.
+
+    The file is written next to its destination first and then renamed, so a
+    crash while saving never leaves a truncated checkpoint behind.
+    """
+    rng = get_rng_state()
+    py_version, py_internal, py_gauss = rng['python']
+    np_name, np_keys, np_pos, np_has_gauss, np_gauss = rng['numpy']
+
+    meta = {
+        'version': CHECKPOINT_VERSION,
+        'params': params,
+        'python_rng': [py_version, py_gauss],
+        'numpy_rng': [np_name, np_pos, np_has_gauss, np_gauss],
+    }
+    payload = dict(arrays)
+    payload['_meta'] = np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8)
+    payload['_python_rng'] = py_internal
+    payload['_numpy_rng'] = np_keys
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez_compressed(f, **payload)
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path):
+    """Return (arrays, params, rng_state) from a checkpoint written by save_checkpoint.
+
+    The RNG state is not applied here: callers rebuild their objects first and
+    then call set_rng_state, so the rebuild does not consume random numbers.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {name: data[name] for name in data.files}
+
+    meta = json.loads(arrays.pop('_meta').tobytes().decode('utf-8'))
+    if meta.get('version') != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version {meta.get('version')} in {path}")
+
+    py_version, py_gauss = meta['python_rng']
+    np_name, np_pos, np_has_gauss, np_gauss = meta['numpy_rng']
+    rng = {
+        'python': (py_version, arrays.pop('_python_rng'), py_gauss),
+        'numpy': (np_name, arrays.pop('_numpy_rng'), np_pos, np_has_gauss, np_gauss),
+    }
+    return arrays, meta['params'], rng
@@ -0,0 +1,385 @@
+"""Headless experience runner, usable from the command line and worker processes."""
+import logging
+import glob
+import os
+import time
+import traceback
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+from modules import simulation
+from modules.simulation import (HEIGHT, WIDTH, create_fish, create_obstacles, create_predators,
+                                load_simulation, save_simulation, seed_rng, step_simulation,
+                                warm_start, warm_start_path)
+from modules.result_cache import ResultCache, code_version, config_key, file_digest
+from modules.export import (ExportPipeline, TrackRecorder, save_array, save_density_curve, save_heatmap,
+                            save_trajectories)
+
+EXPERIENCE_TYPES = ['zone_frequency', 'fish_trajectories', 'fish_density']
+
+# Experiences run a fixed number of steps so that seeded runs are reproducible and cacheable
+EXPERIENCE_FPS = 60
+RESULTS_DIR = "./results/"
+result_cache = None
+export_pipeline = None
+
+def configure_logging():
+    logging.basicConfig(filename='fish_simulation.log', level=logging.DEBUG)
+
+def get_result_cache():
+    global result_cache
+    if result_cache is None:
+        result_cache = ResultCache()
+    return result_cache
+
+def get_export_pipeline():
+    global export_pipeline
+    if export_pipeline is None:
+        export_pipeline = ExportPipeline()
+    return export_pipeline
+
+def experience_config(experience_type, steps, seed, start_mode, warm_start_digest=None):
+    """Everything that determines an experience's results, used as the cache key."""
+    modules_dir = os.path.dirname(os.path.abspath(__file__))
+    sources = [os.path.join(modules_dir, name) for name in os.listdir(modules_dir)
+               if name.endswith(".py") and name != "gui.py"]
+    return {
+        'experience_type': experience_type,
+        'fish_count': simulation.fish_count,
+        'steps': steps,
+        'width': WIDTH,
+        'height': HEIGHT,
+        'boundary_behavior_enabled': simulation.boundary_behavior_enabled,
+        'predators_enabled': simulation.predators_enabled,
+        'predator_count': simulation.predator_count if simulation.predators_enabled else 0,
+        'obstacles_enabled': simulation.obstacles_enabled,
+        'open_population': {
+            'enabled': simulation.open_population_enabled,
+            'source_width': simulation.SOURCE_WIDTH,
+            'sink_width': simulation.SINK_WIDTH,
+            'spawn_per_step': simulation.SPAWN_PER_STEP,
+        },
+        'species': simulation.species_table().describe(),
+        'steering': {
+            'separation_weight': simulation.SEPARATION_WEIGHT,
+            'alignment_weight': simulation.ALIGNMENT_WEIGHT,
+            'cohesion_weight': simulation.COHESION_WEIGHT,
+            'avoidance_weight': simulation.AVOIDANCE_WEIGHT,
+            'flee_weight': simulation.FLEE_WEIGHT,
+            'neighbour_radius': simulation.NEIGHBOUR_RADIUS,
+            'separation_radius': simulation.SEPARATION_RADIUS,
+            'obstacle_avoid_radius': simulation.OBSTACLE_AVOID_RADIUS,
+            'predator_flee_radius': simulation.PREDATOR_FLEE_RADIUS,
+            'predator_hunt_radius': simulation.PREDATOR_HUNT_RADIUS,
+        },
+        'seed': seed,
+        'start_mode': start_mode,
+        'warm_start': warm_start_digest,
+        'code_version': code_version(sources),
+    }
+
+def autosave_prefix(experience_type, steps):
+    """File name prefix shared by the autosaves of one experience configuration.
+
+    The seed and start mode are left out: an autosave carries its own RNG
+    state, and a `resume` run must find the random or warm run it continues.
+    """
+    config = experience_config(experience_type, steps, seed=None, start_mode=None)
+    return os.path.join(simulation.CHECKPOINT_DIR, f"autosave_{experience_type}_{config_key(config)[:16]}")
+
+def claim_autosave(prefix, path):
+    """Move the newest autosave matching `prefix` to `path`; return False if there is none.
+
+    The rename is atomic, so two jobs resuming the same configuration never
+    continue from the same autosave.
+    """
+    def modified(candidate):
+        try:
+            return os.path.getmtime(candidate)
+        except OSError:
+            return 0
+
+    for candidate in sorted(glob.glob(f"{prefix}_*.npz"), key=modified, reverse=True):
+        try:
+            os.replace(candidate, path)
+            return True
+        except FileNotFoundError:
+            continue  # Claimed by another job meanwhile
+    return False
+
+# Settings an autosave must share with the current run to be resumed
+RESUME_SETTINGS = ['boundary_behavior_enabled', 'predators_enabled', 'obstacles_enabled',
+                   'open_population_enabled', 'mixed_species_enabled']
+
+def check_resume(params, experience_type):
+    """Raise ValueError if an autosave was written under different settings than the current ones."""
+    if params['experience_type'] != experience_type:
+        raise ValueError(f"Autosave is for a {params['experience_type']} experience")
+    different = [name for name in RESUME_SETTINGS if params.get(name, False) != getattr(simulation, name)]
+    if different:
+        raise ValueError(f"Autosave was written with different settings: {', '.join(different)}")
+
+def run_experience(experience_type, duration, start_mode='random', seed=None,
+                   progress=None, cancelled=None, telemetry=None):
+    """Run an experience headless and return the paths of its result files.
+
+    Seeded runs that are not resumed are looked up in the result cache first,
+    and stored there once they complete. Nothing is drawn and the loop runs as
+    fast as possible; `progress(fraction)` is called periodically and
+    `cancelled()` is checked between steps. When a TelemetryServer is given as
+    `telemetry`, every step is published to it.
+    """
+    try:
+        # Fix for experience_type being a tuple
+        if isinstance(experience_type, tuple):
+            experience_type = experience_type[0]
+        if isinstance(start_mode, tuple):
+            start_mode = start_mode[0]
+        
+        logging.info(f"Starting experience: {experience_type} for {duration} seconds ({start_mode})")
+        if experience_type not in EXPERIENCE_TYPES:
+            logging.error(f"Unknown experience type: {experience_type}")
+            return
+
+        steps = int(duration * EXPERIENCE_FPS)
+        # Each run owns its autosave file, so concurrent jobs never overwrite or
+        # delete each other's resume point
+        prefix = autosave_prefix(experience_type, steps)
+        autosave_path = f"{prefix}_{uuid.uuid4().hex[:8]}.npz"
+        cache_config = None
+        resumed = None
+        if seed is not None:
+            seed_rng(seed)
+
+        if start_mode == 'resume':
+            if claim_autosave(prefix, autosave_path):
+                fishes, predators, arrays, params = load_simulation(autosave_path)
+                check_resume(params, experience_type)
+                resumed = (arrays, params)
+            elif glob.glob(os.path.join(simulation.CHECKPOINT_DIR, f"autosave_{experience_type}_*.npz")):
+                # Continuing one of them would mix two configurations in one result
+                raise ValueError(f"No {experience_type} autosave matches the current fish count, duration "
+                                 f"and settings; resume with the settings of the interrupted run")
+            else:
+                logging.warning("No autosave to resume from, starting a new experience")
+        if resumed is None:
+            warm_start_digest = None
+            if start_mode == 'warm':
+                fishes, predators = warm_start()
+                warm_start_digest = file_digest(warm_start_path())
+
+            if seed is not None:
+                cache_config = experience_config(experience_type, steps, seed, start_mode, warm_start_digest)
+                cached = get_result_cache().get(cache_config)
+                if cached is not None:
+                    logging.info(f"Experience served from cache: {cached}")
+                    for path in cached:
+                        print(f"Cached result: {path}")
+                    return cached
+            # Loading the warm start restored the RNG state saved after its burn-in;
+            # reseed so unseeded runs don't all replay it (None draws from OS entropy)
+            seed_rng(seed)
+
+            if start_mode != 'warm':
+                fishes = create_fish(simulation.fish_count)
+                predators = create_predators(simulation.predator_count) if simulation.predators_enabled else []
+        obstacles = create_obstacles() if simulation.obstacles_enabled else None
+        interactions = []
+        frame = 0
+        # Analytics keep one layer per species, in the order of the species table
+        species = fishes.table.species
+
+        if experience_type == 'zone_frequency':
+            heatmap = np.zeros((len(species), HEIGHT, WIDTH), dtype=np.float32)
+        elif experience_type == 'fish_trajectories':
+            # Tracks are simplified chunk by chunk instead of kept as fish x steps arrays
+            tracks = TrackRecorder(fishes.capacity)
+        elif experience_type == 'fish_density':
+            densities = []
+            grid_size = 50  # Size of each grid cell for density measurement
+            grid_rows = HEIGHT // grid_size
+            grid_cols = WIDTH // grid_size
+
+        if resumed is not None:
+            arrays, params = resumed
+            frame = params['frame']
+            interactions = [tuple(row) for row in arrays['interactions']]
+            if experience_type == 'zone_frequency':
+                heatmap = arrays['heatmap']
+                if heatmap.ndim == 2:
+                    heatmap = heatmap[np.newaxis]  # Autosave from before species
+            elif experience_type == 'fish_trajectories':
+                tracks = TrackRecorder.from_arrays(arrays, fishes.capacity)
+            elif experience_type == 'fish_density':
+                densities = list(arrays['densities'].reshape(len(arrays['densities']), -1))
+            logging.info(f"Resuming experience at frame {frame} of {steps}")
+
+        def autosave():
+            analytics = {'interactions': np.array(interactions, dtype=np.float32).reshape(-1, 4)}
+            if experience_type == 'zone_frequency':
+                analytics['heatmap'] = heatmap
+            elif experience_type == 'fish_trajectories':
+                analytics.update(tracks.to_arrays())
+            elif experience_type == 'fish_density':
+                analytics['densities'] = np.array(densities, dtype=np.float64).reshape(-1, len(species))
+            save_simulation(autosave_path, fishes, predators, analytics,
+                            {'experience_type': experience_type, 'frame': frame})
+
+        while frame < steps:
+            if cancelled is not None and cancelled():
+                # Save the frames done so far, so the job resumes exactly where it stopped
+                autosave()
+                logging.info(f"Experience cancelled at frame {frame} of {steps}")
+                return []
+
+            if experience_type == 'fish_density':
+                grid = np.zeros((len(species), grid_rows, grid_cols))
+
+            step_start = time.perf_counter()
+            spawned = step_simulation(fishes, predators, obstacles, frame, interactions)
+            if telemetry is not None:
+                telemetry.publish_step(frame, fishes, (time.perf_counter() - step_start) * 1000)
+
+            if experience_type == 'fish_trajectories':
+                tracks.reserve(fishes.capacity)
+                for fish in spawned:
+                    tracks.start(fish.id)
+                tracks.record(fishes)
+
+            for kind, group in fishes.groups():
+                layer = kind.index
+                for fish in group:
+                    if experience_type == 'zone_frequency':
+                        x, y = int(fish.pos.x), int(fish.pos.y)
+                        if 0 <= x < WIDTH and 0 <= y < HEIGHT:
+                            heatmap[layer, y, x] += 1
+                    elif experience_type == 'fish_density':
+                        row = int(fish.pos.y) // grid_size
+                        col = int(fish.pos.x) // grid_size
+                        if 0 <= row < grid_rows and 0 <= col < grid_cols:
+                            grid[layer, row, col] += 1
+
+            if experience_type == 'fish_density':
+                # Average density per species; the school's density is their sum
+                densities.append(grid.mean(axis=(1, 2)))
+
+            frame += 1
+            if progress is not None and frame % 30 == 0:
+                progress(frame / steps)
+
+            if frame < steps and frame % simulation.AUTOSAVE_INTERVAL == 0:
+                autosave()
+
+        if os.path.exists(autosave_path):
+            os.remove(autosave_path)
+
+        logging.info("Experience completed. Preparing to save results.")
+        logging.debug(f"Experience type: {experience_type}")
+
+        # Create results directory if it doesn't exist
+        results_dir = RESULTS_DIR
+        try:
+            os.makedirs(results_dir, exist_ok=True)
+            logging.info(f"Results directory created/confirmed: {results_dir}")
+        except Exception as e:
+            logging.error(f"Failed to create results directory: {e}")
+            raise
+
+        # Generate timestamp for unique filenames
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+        # Encoding happens on the export thread pool; arrays handed over are not touched again
+        exporter = get_export_pipeline()
+        if predators:
+            # Columns: frame, predator id, fish in contact, nearest fish distance
+            interaction_data = np.array(interactions, dtype=np.float32).reshape(-1, 4)
+            logging.info(f"Predator interactions: {len(interactions)} records, "
+                         f"{int(interaction_data[:, 2].sum())} contacts")
+            exporter.submit(save_array, interaction_data,
+                            os.path.join(results_dir, f"predator_interactions_{timestamp}.npy"))
+
+        # With several species, each analytic is also exported per species
+        by_species = len(species) > 1
+        if experience_type == 'zone_frequency':
+            if np.max(heatmap) == 0:
+                logging.warning("Heatmap is empty. No fish movements detected.")
+            else:
+                exporter.submit(save_heatmap, heatmap.sum(axis=0), os.path.join(results_dir, f"heatmap_{timestamp}.png"))
+            if by_species:
+                for kind in species:
+                    if np.max(heatmap[kind.index]) > 0:
+                        exporter.submit(save_heatmap, heatmap[kind.index],
+                                        os.path.join(results_dir, f"heatmap_{kind.name}_{timestamp}.png"))
+        elif experience_type == 'fish_trajectories':
+            points, segments = tracks.tracks()
+            logging.debug(f"Trajectories: {len(segments)} lines, decimated from {tracks.recorded} "
+                          f"to {tracks.kept} points")
+            colors = [fish.color if fish is not None else (0, 0, 0) for fish in fishes.slots]
+            colors += [(0, 0, 0)] * (len(tracks.buffer) - len(colors))
+            exporter.submit(save_trajectories, points, segments, colors, (WIDTH, HEIGHT),
+                            os.path.join(results_dir, f"trajectories_{timestamp}.png"))
+            if by_species:
+                # Each task picks the lines of its species from the shared arrays
+                for kind in species:
+                    exporter.submit(save_trajectories, points, segments, colors, (WIDTH, HEIGHT),
+                                    os.path.join(results_dir, f"trajectories_{kind.name}_{timestamp}.png"),
+                                    kind.index)
+        elif experience_type == 'fish_density':
+            densities = np.array(densities, dtype=np.float64).reshape(-1, len(species))
+            total = densities.sum(axis=1)
+            exporter.submit(save_density_curve, total,
+                            os.path.join(results_dir, f"fish_density_{timestamp}.png"))
+            exporter.submit(save_array, total,
+                            os.path.join(results_dir, f"fish_density_data_{timestamp}.npy"))
+            if by_species:
+                exporter.submit(save_density_curve, densities,
+                                os.path.join(results_dir, f"fish_density_by_species_{timestamp}.png"),
+                                [kind.name for kind in species])
+                exporter.submit(save_array, densities,
+                                os.path.join(results_dir, f"fish_density_by_species_data_{timestamp}.npy"))
+
+        outputs = exporter.wait()
+        for filename in outputs:
+            print(f"Result saved as {filename}")
+        for e in exporter.errors:
+            print(f"Error saving results: {e}")
+
+        if cache_config is not None and outputs and not exporter.errors:
+            try:
+                if get_result_cache().put(cache_config, outputs) is None:
+                    logging.info("Experience results are larger than the cache and were not cached")
+                else:
+                    logging.info(f"Experience results cached ({len(outputs)} files)")
+            except Exception as e:
+                logging.error(f"Failed to cache experience results: {e}")
+        return outputs
+    except Exception as e:
+        logging.error(f"An error occurred during the experience: {e}")
+        logging.error(traceback.format_exc())
+        print(f"An error occurred: {e}")
+
+def experience_worker(job_id, config, events, cancel_event):
+    """Entry point of an experience worker process."""
+    configure_logging()
+    try:
+        simulation.fish_count = config['fish_count']
+        simulation.boundary_behavior_enabled = config['boundary_behavior_enabled']
+        simulation.predators_enabled = config['predators_enabled']
+        simulation.obstacles_enabled = config['obstacles_enabled']
+        simulation.open_population_enabled = config.get('open_population_enabled', False)
+        simulation.mixed_species_enabled = config.get('mixed_species_enabled', False)
+
+        outputs = run_experience(config['experience_type'], config['duration'], config['start_mode'],
+                                 config['seed'],
+                                 progress=lambda fraction: events.put((job_id, 'progress', fraction)),
+                                 cancelled=cancel_event.is_set)
+        if outputs is None:
+            events.put((job_id, 'error', "experience failed, see fish_simulation.log"))
+        else:
+            events.put((job_id, 'done', outputs))
+    except Exception as e:
+        logging.error(f"Experience worker {job_id} failed: {e}")
+        logging.error(traceback.format_exc())
+        events.put((job_id, 'error', str(e)))
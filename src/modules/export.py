@@ -0,0 +1,292 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Black, Blue, Cyan, Green, Yellow, Red, Violet
+HEATMAP_COLORS = [(0, 0, 0), (0, 0, 1), (0, 1, 1), (0, 1, 0), (1, 1, 0), (1, 0, 0), (1, 0, 1)]
+
+
+def build_lut(colors, size=256):
+    """Interpolate color stops (floats in [0, 1]) into a (size, 3) uint8 lookup table."""
+    stops = np.linspace(0, 1, len(colors))
+    samples = np.linspace(0, 1, size)
+    channels = np.asarray(colors, dtype=np.float64)
+    lut = np.empty((size, 3), dtype=np.uint8)
+    for channel in range(3):
+        lut[:, channel] = np.round(np.interp(samples, stops, channels[:, channel]) * 255)
+    return lut
+
+
+HEATMAP_LUT = build_lut(HEATMAP_COLORS)
+
+
+def colorize(values, lut=HEATMAP_LUT):
+    """Map a 2D array to RGB through a lookup table, normalized by its maximum.
+
+    Only a uint8 index array and the uint8 RGB result are allocated, instead of
+    the float64 RGBA array a matplotlib colormap would produce.
+    """
+    peak = float(values.max())
+    scale = (len(lut) - 1) / peak if peak > 0 else 0
+    indices = np.empty(values.shape, dtype=np.uint8)
+    np.multiply(values, scale, out=indices, casting='unsafe')
+    return lut[indices]
+
+
+def douglas_peucker(points, epsilon):
+    """Simplify a polyline, keeping points further than epsilon from the simplified line."""
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) < 3:
+        return points
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = points[end] - points[start]
+        offsets = points[start + 1:end] - points[start]
+        length = np.hypot(segment[0], segment[1])
+        if length == 0:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        index = int(np.argmax(distances))
+        if distances[index] > epsilon:
+            split = start + 1 + index
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return points[keep]
+
+
+_pygame_lock = threading.Lock()
+
+
+def import_pygame():
+    # Export threads racing on the first import of pygame can see a partially
+    # initialized pygame.surfarray, so the first import is serialized
+    with _pygame_lock:
+        import pygame
+        import pygame.surfarray
+    return pygame
+
+
+def save_heatmap(heatmap, path):
+    pygame = import_pygame()
+
+    # surfarray expects (width, height, 3); the transpose is a view, not a copy
+    rgb = colorize(heatmap).transpose(1, 0, 2)
+    surface = pygame.Surface(rgb.shape[:2])
+    pygame.surfarray.blit_array(surface, rgb)
+    pygame.image.save(surface, path)
+    return path
+
+
+def split_segments(track, state):
+    """Split a track into runs of recorded points.
+
+    `state` is 0 where nothing was recorded, 1 for a point continuing the line
+    and 2 for the first point of a new line.
+    """
+    present = state > 0
+    starts = present & ((state == 2) | ~np.concatenate(([False], present[:-1])))
+    indices = np.flatnonzero(present)
+    if not len(indices):
+        return []
+    cuts = np.flatnonzero(starts[indices])
+    return np.split(track[indices], cuts[cuts > 0])
+
+
+class TrackRecorder:
+    """Records one track per pool slot, simplified as the run goes.
+
+    Positions go into a buffer of `chunk` steps per slot. When it is full,
+    every run of points is simplified with Douglas-Peucker and appended to
+    flat arrays, and the buffer is reused, so memory follows the simplified
+    tracks instead of fish x steps. The last step of a chunk is carried over
+    as the first of the next one, so lines continue across chunks.
+
+    The buffer state is 0 where the slot is empty, 1 for a recorded point and
+    2 for the first point of a fish, so reused slots start a new line.
+    """
+
+    def __init__(self, capacity, chunk=120, epsilon=1.0):
+        self.chunk = chunk
+        self.epsilon = epsilon
+        # Columns hold x, y and species; column 0 is the carried over step
+        self.buffer = np.zeros((capacity, chunk + 1, 3), dtype=np.int16)
+        self.state = np.zeros((capacity, chunk + 1), dtype=np.uint8)
+        self.column = 1
+        self.points = []  # Simplified points, (n, 2) int16 per flush
+        self.segments = []  # (slot, species, point count) per line, (m, 3) int32 per flush
+        self.recorded = 0
+        self.kept = 0
+
+    def reserve(self, capacity):
+        extra = capacity - len(self.buffer)
+        if extra > 0:
+            self.buffer = np.concatenate((self.buffer, np.zeros((extra,) + self.buffer.shape[1:], dtype=np.int16)))
+            self.state = np.concatenate((self.state, np.zeros((extra, self.chunk + 1), dtype=np.uint8)))
+
+    def start(self, slot):
+        """Make the point recorded for `slot` this step the first of a new line."""
+        self.state[slot, self.column] = 2
+
+    def record(self, fishes):
+        """Record every fish of the pool for the current step."""
+        rows = np.array([(fish.id, int(fish.pos.x), int(fish.pos.y), fish.species.index) for fish in fishes],
+                        dtype=np.int64).reshape(-1, 4)
+        self.reserve(fishes.capacity)
+        slots = rows[:, 0]
+        self.buffer[slots, self.column] = rows[:, 1:]
+        self.state[slots, self.column] = np.maximum(self.state[slots, self.column], 1)
+        self.column += 1
+        if self.column > self.chunk:
+            self.flush()
+
+    def flush(self):
+        """Simplify the buffered steps and start a new chunk after the last one."""
+        end = self.column
+        points, segments = [], []
+        for slot in np.flatnonzero((self.state[:, 1:end] > 0).any(axis=1)):
+            for run in split_segments(self.buffer[slot, :end], self.state[slot, :end]):
+                simplified = douglas_peucker(run[:, :2], self.epsilon)
+                self.recorded += len(run)
+                if len(simplified) > 1:  # A line needs at least 2 points
+                    points.append(simplified.astype(np.int16))
+                    segments.append((slot, run[-1, 2], len(simplified)))
+        if points:
+            self.kept += sum(len(line) for line in points)
+            self.points.append(np.concatenate(points))
+            self.segments.append(np.array(segments, dtype=np.int32))
+
+        self.buffer[:, 0] = self.buffer[:, end - 1]
+        self.state[:, 0] = self.state[:, end - 1]
+        self.state[:, 1:] = 0
+        self.column = 1
+
+    def tracks(self):
+        """Flush and return (points, segments) as two flat arrays."""
+        if self.column > 1:
+            self.flush()
+        points = np.concatenate(self.points) if self.points else np.zeros((0, 2), dtype=np.int16)
+        segments = np.concatenate(self.segments) if self.segments else np.zeros((0, 3), dtype=np.int32)
+        self.points, self.segments = [points], [segments]
+        return points, segments
+
+    def to_arrays(self):
+        """Arrays for an autosave; `from_arrays` restores the recorder."""
+        points, segments = self.tracks()
+        return {'track_points': points, 'track_segments': segments,
+                'track_tail': self.buffer[:, 0], 'track_tail_state': self.state[:, 0]}
+
+    @classmethod
+    def from_arrays(cls, arrays, capacity, chunk=120, epsilon=1.0):
+        recorder = cls(max(capacity, len(arrays['track_tail'])), chunk, epsilon)
+        recorder.points = [arrays['track_points']]
+        recorder.segments = [arrays['track_segments']]
+        tail = arrays['track_tail']
+        recorder.buffer[:len(tail), 0] = tail
+        recorder.state[:len(tail), 0] = arrays['track_tail_state']
+        return recorder
+
+
+def save_trajectories(points, segments, colors, size, path, species=None):
+    """Draw the lines of a TrackRecorder, only those of one species if given."""
+    pygame = import_pygame()
+
+    ends = np.cumsum(segments[:, 2])
+    starts = ends - segments[:, 2]
+    lines = np.arange(len(segments))
+    if species is not None:
+        # Points recorded while a slot held another species are left out
+        lines = lines[segments[:, 1] == species]
+
+    surface = pygame.Surface(size)
+    surface.fill((255, 255, 255))
+    for line in lines:
+        pygame.draw.lines(surface, colors[segments[line, 0]], False, points[starts[line]:ends[line]].tolist(), 1)
+    pygame.image.save(surface, path)
+    return path
+
+
+def simplify_curve(values):
+    points = np.column_stack((np.arange(len(values)), values))
+    value_range = float(np.ptp(values)) if len(values) else 0
+    if value_range > 0:
+        # Normalize the axes so one epsilon applies to both
+        scale = np.array([len(values), value_range])
+        points = douglas_peucker(points / scale, 1e-3) * scale
+    return points
+
+
+def save_density_curve(densities, path, labels=None):
+    """Plot one density curve, or one per column of a 2D array named by `labels`."""
+    # Agg canvas without pyplot: no global figure state and no GUI backend
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    densities = np.asarray(densities, dtype=np.float64)
+    figure = Figure(figsize=(10, 6))
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+    if densities.ndim == 1:
+        points = simplify_curve(densities)
+        axes.plot(points[:, 0], points[:, 1])
+    else:
+        for column, label in zip(densities.T, labels):
+            points = simplify_curve(column)
+            axes.plot(points[:, 0], points[:, 1], label=label)
+        axes.legend()
+    axes.set_xlabel('Time (frames)')
+    axes.set_ylabel('Average Fish Density')
+    axes.set_title('Average Fish Density Over Time')
+    figure.savefig(path)
+    return path
+
+
+def save_array(array, path):
+    np.save(path, array)
+    return path
+
+
+class ExportPipeline:
+    """Encodes result files on a small thread pool.
+
+    Each `submit` hands an array over to a background thread; callers must not
+    modify it afterwards. `wait` returns the written paths in submission order;
+    failed exports are logged and collected in `errors` instead of raised.
+    """
+
+    def __init__(self, max_workers=2):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='export')
+        self.futures = []
+        self.errors = []
+
+    def submit(self, function, *args, **kwargs):
+        future = self.executor.submit(function, *args, **kwargs)
+        self.futures.append(future)
+        return future
+
+    def wait(self):
+        paths = []
+        self.errors = []
+        for future in self.futures:
+            try:
+                path = future.result()
+            except Exception as e:
+                logging.error(f"Export failed: {e}", exc_info=True)
+                self.errors.append(e)
+                continue
+            logging.info(f"Exported {path}")
+            paths.append(path)
+        self.futures = []
+        return paths
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
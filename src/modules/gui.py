@@ -0,0 +1,418 @@
+"""Interactive pygame front-end.
+
+Nothing is initialized at import time: `init_gui` opens the window and builds
+the toolbar when `main` starts.
+"""
+import logging
+import os
+import time
+
+import numpy as np
+import pygame
+import pygame_gui
+
+from modules import simulation
+from modules.simulation import (HEIGHT, WIDTH, create_fish, create_obstacles, create_predators,
+                                load_simulation, save_simulation, step_simulation)
+from modules.experience import EXPERIENCE_TYPES, experience_worker
+from modules.jobs import JobManager
+from modules.quality import DEFAULT_TARGET_FPS, QualityController
+
+screen = None
+manager = None
+
+# Buttons and UI elements, created by init_gui
+start_button = None
+stop_button = None
+experience_button = None
+bounce_toggle = None
+fish_count_entry = None
+update_fish_count = None
+predator_toggle = None
+obstacle_toggle = None
+target_fps_entry = None
+set_target_fps = None
+quality_label = None
+species_toggle = None
+
+# Popup for experience settings
+experience_window = None
+experience_dropdown = None
+start_mode_dropdown = None
+duration_entry = None
+seed_entry = None
+start_experience_button = None
+
+# Background experience jobs and their progress rows in the GUI
+MAX_CONCURRENT_EXPERIENCES = 2
+job_manager = None
+job_rows = {}
+
+def init_gui():
+    global screen, manager, start_button, stop_button, experience_button, bounce_toggle
+    global fish_count_entry, update_fish_count, predator_toggle, obstacle_toggle
+    global target_fps_entry, set_target_fps, quality_label, species_toggle
+
+    # Initialize Pygame
+    pygame.init()
+
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("Fishband")
+
+    # Set custom logo
+    logo = pygame.image.load("data/icon/fish.png")
+    pygame.display.set_icon(logo)
+
+    # GUI manager
+    manager = pygame_gui.UIManager((WIDTH, HEIGHT), 'data/themes/theme.json')
+
+    start_button = pygame_gui.elements.UIButton(relative_rect=pygame.Rect((10, 10), (100, 50)),
+                                                text='Start',
+                                                manager=manager)
+    stop_button = pygame_gui.elements.UIButton(relative_rect=pygame.Rect((120, 10), (100, 50)),
+                                               text='Stop',
+                                               manager=manager)
+    experience_button = pygame_gui.elements.UIButton(relative_rect=pygame.Rect((230, 10), (150, 50)),
+                                                     text='Launch Experience',
+                                                     manager=manager)
+    bounce_toggle = pygame_gui.elements.UIButton(relative_rect=pygame.Rect((390, 10), (150, 50)),
+                                                 text='Toggle Bounce',
+                                                 manager=manager)
+    pygame_gui.elements.UILabel(relative_rect=pygame.Rect((550, 10), (100, 50)),
+                                text='Fish Count:',
+                                manager=manager)
+    fish_count_entry = pygame_gui.elements.UITextEntryLine(relative_rect=pygame.Rect((660, 10), (50, 50)),
+                                                           manager=manager)
+    update_fish_count = pygame_gui.elements.UIButton(relative_rect=pygame.Rect((720, 10), (100, 50)),
+                                                     text='Update',
+                                                     manager=manager)
+    predator_toggle = pygame_gui.elements.UIButton(relative_rect=pygame.Rect((830, 10), (150, 50)),
+                                                   text='Toggle Predators',
+                                                   manager=manager)
+    obstacle_toggle = pygame_gui.elements.UIButton(relative_rect=pygame.Rect((990, 10), (150, 50)),
+                                                   text='Toggle Obstacles',
+                                                   manager=manager)
+
+    # Second row: frame rate target and the level picked by the quality controller
+    pygame_gui.elements.UILabel(relative_rect=pygame.Rect((10, 70), (100, 35)),
+                                text='Target FPS:',
+                                manager=manager)
+    target_fps_entry = pygame_gui.elements.UITextEntryLine(relative_rect=pygame.Rect((120, 70), (50, 35)),
+                                                           manager=manager)
+    set_target_fps = pygame_gui.elements.UIButton(relative_rect=pygame.Rect((180, 70), (60, 35)),
+                                                  text='Set',
+                                                  manager=manager)
+    quality_label = pygame_gui.elements.UILabel(relative_rect=pygame.Rect((250, 70), (330, 35)),
+                                                text='Quality: -',
+                                                manager=manager)
+    species_toggle = pygame_gui.elements.UIButton(relative_rect=pygame.Rect((590, 70), (150, 35)),
+                                                  text='Toggle Species',
+                                                  manager=manager)
+
+def draw_fish(screen, fish, heading=True):
+    pygame.draw.circle(screen, fish.color, (int(fish.pos.x), int(fish.pos.y)), fish.size)
+    if heading:
+        end_pos = fish.pos + fish.direction * 10
+        pygame.draw.line(screen, fish.color, (int(fish.pos.x), int(fish.pos.y)),
+                         (int(end_pos.x), int(end_pos.y)), 2)
+
+def draw_school(screen, fishes, quality):
+    """Draw the school at the level of detail of a RenderLevel."""
+    if quality.fish_lod == 'circle':
+        for fish in fishes:
+            draw_fish(screen, fish, quality.heading_lines)
+    elif quality.fish_lod == 'dot':
+        for fish in fishes:
+            screen.fill(fish.color, (int(fish.pos.x) - 1, int(fish.pos.y) - 1, 3, 3))
+    else:
+        # One pixel per fish in a single array write instead of a draw call each
+        positions = np.array([(fish.pos.x, fish.pos.y) for fish in fishes], dtype=np.int32).reshape(-1, 2)
+        colors = np.array([fish.color for fish in fishes], dtype=np.uint8).reshape(-1, 3)
+        x, y = positions[:, 0], positions[:, 1]
+        inside = (x >= 0) & (x < WIDTH) & (y >= 0) & (y < HEIGHT)
+        pixels = pygame.surfarray.pixels3d(screen)
+        pixels[x[inside], y[inside]] = colors[inside]
+        del pixels  # Unlocks the surface
+
+def draw_predator(screen, predator):
+    pygame.draw.circle(screen, predator.color, (int(predator.pos.x), int(predator.pos.y)), predator.size)
+    end_pos = predator.pos + predator.direction * 15
+    pygame.draw.line(screen, predator.color, (int(predator.pos.x), int(predator.pos.y)),
+                     (int(end_pos.x), int(end_pos.y)), 3)
+
+def draw_obstacles(screen, obstacles):
+    for shape in obstacles.shapes:
+        if shape[0] == 'circle':
+            _, x, y, r = shape
+            pygame.draw.circle(screen, (120, 110, 100), (int(x), int(y)), int(r))
+        elif shape[0] == 'rect':
+            _, x, y, w, h = shape
+            pygame.draw.rect(screen, (120, 110, 100), pygame.Rect(int(x), int(y), int(w), int(h)))
+
+def submit_experience(experience_type, duration, start_mode, seed):
+    # Settings are captured now so later toolbar changes don't affect queued jobs
+    config = {
+        'experience_type': experience_type[0] if isinstance(experience_type, tuple) else experience_type,
+        'duration': duration,
+        'start_mode': start_mode[0] if isinstance(start_mode, tuple) else start_mode,
+        'seed': seed,
+        'fish_count': simulation.fish_count,
+        'boundary_behavior_enabled': simulation.boundary_behavior_enabled,
+        'predators_enabled': simulation.predators_enabled,
+        'obstacles_enabled': simulation.obstacles_enabled,
+        'open_population_enabled': simulation.open_population_enabled,
+        'mixed_species_enabled': simulation.mixed_species_enabled,
+    }
+    job = job_manager.submit(config)
+    add_job_row(job)
+    print(f"Experience {config['experience_type']} queued as job {job.id}")
+
+def add_job_row(job):
+    y = HEIGHT - 45 * (len(job_rows) + 1)
+    label = pygame_gui.elements.UILabel(relative_rect=pygame.Rect((10, y), (220, 35)),
+                                        text=f"#{job.id} {job.config['experience_type']}: queued",
+                                        manager=manager)
+    bar = pygame_gui.elements.UIProgressBar(relative_rect=pygame.Rect((240, y), (200, 35)),
+                                            manager=manager)
+    cancel_button = pygame_gui.elements.UIButton(relative_rect=pygame.Rect((450, y), (80, 35)),
+                                                 text='Cancel',
+                                                 manager=manager)
+    job_rows[job.id] = (label, bar, cancel_button)
+
+def remove_job_row(job_id):
+    for element in job_rows.pop(job_id):
+        element.kill()
+    # Restack the remaining rows from the bottom
+    for i, (label, bar, cancel_button) in enumerate(job_rows.values()):
+        y = HEIGHT - 45 * (i + 1)
+        label.set_relative_position((10, y))
+        bar.set_relative_position((240, y))
+        cancel_button.set_relative_position((450, y))
+
+def update_job_rows():
+    for job in job_manager.poll():
+        if job.status == 'done':
+            for path in job.outputs:
+                print(f"Job {job.id} result: {path}")
+        elif job.status == 'failed':
+            print(f"Job {job.id} failed: {job.error}")
+
+    for job_id, (label, bar, cancel_button) in job_rows.items():
+        job = job_manager.jobs[job_id]
+        label.set_text(f"#{job.id} {job.config['experience_type']}: {job.status}")
+        bar.set_current_progress(job.progress * 100)
+        cancel_button.set_text('Close' if job.finished else 'Cancel')
+
+def main(startup_start=None, target_fps=DEFAULT_TARGET_FPS, telemetry=None):
+    global job_manager
+    init_gui()
+    if startup_start is not None:
+        logging.info(f"GUI startup: {time.perf_counter() - startup_start:.3f}s")
+    fishes = create_fish(simulation.fish_count)
+    predators = []
+    obstacles = None
+    job_manager = JobManager(experience_worker, MAX_CONCURRENT_EXPERIENCES)
+    quality = QualityController(target_fps)
+    target_fps_entry.set_text(str(target_fps))
+    logging.info(f"Quality {quality.name} at a target of {target_fps} FPS")
+    clock = pygame.time.Clock()
+    running = True
+    simulating = False
+    frame = 0
+
+    while running:
+        time_delta = clock.tick(quality.target_fps)/1000.0
+        frame_start = time.perf_counter()
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+
+            if event.type == pygame.KEYDOWN and event.key in (pygame.K_F5, pygame.K_F9):
+                interactive_path = os.path.join(simulation.CHECKPOINT_DIR, "interactive.npz")
+                try:
+                    if event.key == pygame.K_F5:
+                        save_simulation(interactive_path, fishes, predators)
+                        print(f"Simulation saved as {interactive_path}")
+                    else:
+                        fishes, predators, _, params = load_simulation(interactive_path)
+                        simulation.fish_count = len(fishes)
+                        simulation.predators_enabled = bool(predators)
+                        simulation.boundary_behavior_enabled = params['boundary_behavior_enabled']
+                        simulation.obstacles_enabled = params['obstacles_enabled']
+                        simulation.open_population_enabled = params.get('open_population_enabled', False)
+                        simulation.mixed_species_enabled = params.get('mixed_species_enabled', False)
+                        obstacles = create_obstacles() if simulation.obstacles_enabled else None
+                        print(f"Simulation loaded from {interactive_path}")
+                except Exception as e:
+                    logging.error(f"Checkpoint operation failed: {e}")
+                    print(f"Checkpoint error: {e}")
+
+            if event.type == pygame_gui.UI_BUTTON_PRESSED:
+                if event.ui_element == start_button:
+                    simulating = True
+                elif event.ui_element == stop_button:
+                    simulating = False
+                elif event.ui_element == experience_button:
+                    show_experience_popup()
+                elif event.ui_element == bounce_toggle:
+                    simulation.boundary_behavior_enabled = not simulation.boundary_behavior_enabled
+                    bounce_toggle.set_text('Bounce: ' + ('On' if simulation.boundary_behavior_enabled else 'Off'))
+                elif event.ui_element == predator_toggle:
+                    simulation.predators_enabled = not simulation.predators_enabled
+                    predators = create_predators(simulation.predator_count) if simulation.predators_enabled else []
+                    predator_toggle.set_text('Predators: ' + ('On' if simulation.predators_enabled else 'Off'))
+                elif event.ui_element == obstacle_toggle:
+                    simulation.obstacles_enabled = not simulation.obstacles_enabled
+                    obstacles = create_obstacles() if simulation.obstacles_enabled else None
+                    obstacle_toggle.set_text('Obstacles: ' + ('On' if simulation.obstacles_enabled else 'Off'))
+                elif event.ui_element == species_toggle:
+                    simulation.mixed_species_enabled = not simulation.mixed_species_enabled
+                    fishes = create_fish(simulation.fish_count)
+                    species_toggle.set_text('Species: ' + ('Mixed' if simulation.mixed_species_enabled else 'Single'))
+                elif event.ui_element == update_fish_count:
+                    try:
+                        new_count = int(fish_count_entry.get_text())
+                        if new_count > 0:
+                            simulation.fish_count = new_count
+                            # Keep the current school and only spawn or despawn the difference
+                            fishes.resize(simulation.fish_count)
+                        else:
+                            print("Fish count must be a positive integer.")
+                    except ValueError:
+                        print("Invalid fish count. Please enter a number.")
+                elif event.ui_element == set_target_fps:
+                    try:
+                        quality.set_target_fps(int(target_fps_entry.get_text()))
+                    except ValueError:
+                        print("Target FPS must be a positive integer.")
+                elif event.ui_element == start_experience_button:
+                    selected_experience = experience_dropdown.selected_option
+                    start_mode = start_mode_dropdown.selected_option
+                    try:
+                        duration = int(duration_entry.get_text())
+                        seed_text = seed_entry.get_text().strip()
+                        seed = int(seed_text) if seed_text else None
+                        experience_window.kill()
+                        submit_experience(selected_experience, duration, start_mode, seed)
+                    except ValueError:
+                        print("Invalid duration or seed. Please enter a number.")
+                else:
+                    for job_id, (label, bar, cancel_button) in list(job_rows.items()):
+                        if event.ui_element == cancel_button:
+                            if job_manager.jobs[job_id].finished:
+                                remove_job_row(job_id)
+                            else:
+                                job_manager.cancel(job_id)
+
+            if event.type == pygame_gui.UI_WINDOW_CLOSE:
+                if event.ui_element == experience_window:
+                    experience_window.kill()
+
+            manager.process_events(event)
+
+        update_job_rows()
+        manager.update(time_delta)
+
+        screen.fill((255, 255, 255))  # White background
+        if obstacles is not None:
+            draw_obstacles(screen, obstacles)
+
+        if simulating:
+            settings = quality.simulation
+            step_start = time.perf_counter()
+            sample = frame % settings.analytics_interval == 0
+            record_trails = sample
+            for substep in range(settings.substeps):
+                step_simulation(fishes, predators, obstacles, frame, dt=1 / settings.substeps,
+                                record_trails=record_trails, steer_interval=settings.steer_interval,
+                                populate=substep == 0, cell_limit=settings.cell_limit)
+                record_trails = False
+            step_ms = (time.perf_counter() - step_start) * 1000
+            if telemetry is not None and sample:
+                telemetry.publish_step(frame, fishes, step_ms)
+
+            for predator in predators:
+                draw_predator(screen, predator)
+
+            draw_school(screen, fishes, quality.render)
+
+        if frame % 30 == 0:
+            quality_label.set_text(f"Render {quality.render.name}, simulation {quality.simulation.name}, "
+                                   f"{clock.get_fps():.0f} FPS")
+
+        manager.draw_ui(screen)
+        pygame.display.flip()
+
+        if simulating:
+            # Only frames that step the simulation say anything about the load
+            quality.update((time.perf_counter() - frame_start) * 1000, step_ms)
+        frame += 1
+
+    job_manager.shutdown()
+    pygame.quit()
+
+def show_experience_popup():
+    global experience_window, experience_dropdown, start_mode_dropdown, duration_entry, seed_entry
+    global start_experience_button
+    experience_window = pygame_gui.elements.UIWindow(
+        pygame.Rect(400, 200, 400, 300),
+        manager,
+        window_display_title='Launch Experience'
+    )
+
+    experience_dropdown = pygame_gui.elements.UIDropDownMenu(
+        EXPERIENCE_TYPES,
+        'zone_frequency',
+        pygame.Rect(20, 20, 360, 30),
+        manager,
+        container=experience_window
+    )
+
+    pygame_gui.elements.UILabel(
+        pygame.Rect(20, 70, 200, 30),
+        "Duration (seconds):",
+        manager,
+        container=experience_window
+    )
+
+    duration_entry = pygame_gui.elements.UITextEntryLine(
+        pygame.Rect(220, 70, 160, 30),
+        manager,
+        container=experience_window
+    )
+
+    pygame_gui.elements.UILabel(
+        pygame.Rect(20, 120, 200, 30),
+        "Start from:",
+        manager,
+        container=experience_window
+    )
+
+    start_mode_dropdown = pygame_gui.elements.UIDropDownMenu(
+        ['random', 'warm', 'resume'],
+        'random',
+        pygame.Rect(220, 120, 160, 30),
+        manager,
+        container=experience_window
+    )
+
+    pygame_gui.elements.UILabel(
+        pygame.Rect(20, 160, 200, 30),
+        "Seed (blank = random):",
+        manager,
+        container=experience_window
+    )
+
+    seed_entry = pygame_gui.elements.UITextEntryLine(
+        pygame.Rect(220, 160, 160, 30),
+        manager,
+        container=experience_window
+    )
+    seed_entry.set_text('0')
+
+    start_experience_button = pygame_gui.elements.UIButton(
+        pygame.Rect(120, 200, 160, 50),
+        'Start Experience',
+        manager,
+        container=experience_window
+    )
@@ -0,0 +1,125 @@
+import itertools
+import logging
+import multiprocessing
+import queue
+
+
+class ExperienceJob:
+    def __init__(self, id, config):
+        self.id = id
+        self.config = config
+        self.status = 'queued'  # queued, running, done, cancelled, failed
+        self.progress = 0.0
+        self.outputs = []
+        self.error = None
+        self.process = None
+        self.cancel_event = None
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'cancelled', 'failed')
+
+
+class JobManager:
+    """Runs experiences in worker processes so the GUI event loop never blocks.
+
+    `target(job_id, config, events, cancel_event)` runs in the worker and reports
+    back through `events` with `(job_id, kind, payload)` tuples, where kind is
+    'progress' (fraction done), 'done' (list of output files) or 'error'
+    (message). Jobs beyond `max_concurrent` wait in a FIFO queue.
+    """
+
+    def __init__(self, target, max_concurrent=2, context=None):
+        if context is None:
+            # Workers only import the side-effect free simulation modules, so a
+            # fresh interpreter is safe and never inherits the parent's display
+            context = multiprocessing.get_context('spawn')
+        self.target = target
+        self.max_concurrent = max_concurrent
+        self.context = context
+        self.events = context.Queue()
+        self.jobs = {}
+        self.pending = []
+        self._ids = itertools.count(1)
+
+    def submit(self, config):
+        job = ExperienceJob(next(self._ids), config)
+        self.jobs[job.id] = job
+        self.pending.append(job)
+        logging.info(f"Job {job.id} queued: {config}")
+        self._start_pending()
+        return job
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None or job.finished:
+            return
+        if job.status == 'queued':
+            self.pending.remove(job)
+            job.status = 'cancelled'
+        else:
+            # The worker checks the event between steps and stops cleanly
+            job.cancel_event.set()
+        logging.info(f"Job {job.id} cancellation requested")
+
+    def running(self):
+        return [job for job in self.jobs.values() if job.status == 'running']
+
+    def poll(self):
+        """Apply worker events, start queued jobs and return jobs that just finished."""
+        exited = [job for job in self.running() if not job.process.is_alive()]
+        finished = []
+
+        while True:
+            try:
+                job_id, kind, payload = self.events.get_nowait()
+            except queue.Empty:
+                break
+            job = self.jobs.get(job_id)
+            if job is None or job.finished:
+                continue
+            if kind == 'progress':
+                job.progress = payload
+            elif kind == 'done':
+                job.outputs = payload
+                job.status = 'cancelled' if job.cancel_event.is_set() else 'done'
+                if job.status == 'done':
+                    job.progress = 1.0
+                finished.append(job)
+            elif kind == 'error':
+                job.error = payload
+                job.status = 'failed'
+                finished.append(job)
+
+        for job in exited:
+            if not job.finished:
+                job.error = f"worker exited with code {job.process.exitcode}"
+                job.status = 'failed'
+                finished.append(job)
+
+        for job in finished:
+            job.process.join()
+            logging.info(f"Job {job.id} {job.status}" + (f": {job.error}" if job.error else ""))
+
+        self._start_pending()
+        return finished
+
+    def shutdown(self, timeout=5):
+        self.pending.clear()
+        for job in self.running():
+            job.cancel_event.set()
+        for job in self.running():
+            job.process.join(timeout)
+            if job.process.is_alive():
+                job.process.terminate()
+
+    def _start_pending(self):
+        while self.pending and len(self.running()) < self.max_concurrent:
+            job = self.pending.pop(0)
+            job.cancel_event = self.context.Event()
+            job.process = self.context.Process(target=self.target,
+                                               args=(job.id, job.config, self.events, job.cancel_event),
+                                               daemon=True)
+            job.status = 'running'
+            job.process.start()
+            logging.info(f"Job {job.id} started (pid {job.process.pid})")
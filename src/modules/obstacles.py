@@ -0,0 +1,77 @@
+import numpy as np
+
+
+class ObstacleField:
+    """Obstacle geometry rasterized into a signed distance field.
+
+    Shapes are added once when the tank is built; after that, each lookup is a
+    single array access returning the distance to the nearest obstacle surface
+    (negative inside an obstacle) and the unit gradient pointing away from it.
+    """
+
+    def __init__(self, width, height, cell_size=4):
+        self.width = width
+        self.height = height
+        self.cell_size = cell_size
+        self.cols = int(np.ceil(width / cell_size))
+        self.rows = int(np.ceil(height / cell_size))
+        self.shapes = []
+
+        # Distance used for cells far away from every obstacle
+        self.far = float(np.hypot(width, height))
+        self.distance = np.full((self.rows, self.cols), self.far, dtype=np.float32)
+        self.grad_x = np.zeros((self.rows, self.cols), dtype=np.float32)
+        self.grad_y = np.zeros((self.rows, self.cols), dtype=np.float32)
+
+        # Cell centre coordinates, shared by every shape rasterization
+        xs = (np.arange(self.cols, dtype=np.float32) + 0.5) * cell_size
+        ys = (np.arange(self.rows, dtype=np.float32) + 0.5) * cell_size
+        self._grid_x, self._grid_y = np.meshgrid(xs, ys)
+
+    def add_circle(self, x, y, r):
+        sdf = np.hypot(self._grid_x - x, self._grid_y - y) - r
+        np.minimum(self.distance, sdf, out=self.distance)
+        self.shapes.append(('circle', x, y, r))
+
+    def add_rectangle(self, x, y, w, h):
+        qx = np.abs(self._grid_x - (x + w / 2)) - w / 2
+        qy = np.abs(self._grid_y - (y + h / 2)) - h / 2
+        outside = np.hypot(np.maximum(qx, 0), np.maximum(qy, 0))
+        inside = np.minimum(np.maximum(qx, qy), 0)
+        np.minimum(self.distance, outside + inside, out=self.distance)
+        self.shapes.append(('rect', x, y, w, h))
+
+    def add_walls(self, thickness=10):
+        """Close the tank with four walls along the borders."""
+        self.add_rectangle(0, 0, self.width, thickness)
+        self.add_rectangle(0, self.height - thickness, self.width, thickness)
+        self.add_rectangle(0, 0, thickness, self.height)
+        self.add_rectangle(self.width - thickness, 0, thickness, self.height)
+
+    def build(self):
+        """Compute the normalized gradient once all shapes have been added."""
+        grad_y, grad_x = np.gradient(self.distance, self.cell_size)
+        magnitude = np.hypot(grad_x, grad_y)
+        magnitude[magnitude == 0] = 1
+        self.grad_x = (grad_x / magnitude).astype(np.float32)
+        self.grad_y = (grad_y / magnitude).astype(np.float32)
+        return self
+
+    def sample(self, x, y):
+        """Return (distance, gradient_x, gradient_y) at a position."""
+        col = min(max(int(x // self.cell_size), 0), self.cols - 1)
+        row = min(max(int(y // self.cell_size), 0), self.rows - 1)
+        return (float(self.distance[row, col]),
+                float(self.grad_x[row, col]),
+                float(self.grad_y[row, col]))
+
+    def sample_many(self, positions):
+        """`sample` for an (n, 2) array of positions: distances and (n, 2) gradients."""
+        cols = np.clip(positions[:, 0] // self.cell_size, 0, self.cols - 1).astype(np.intp)
+        rows = np.clip(positions[:, 1] // self.cell_size, 0, self.rows - 1).astype(np.intp)
+        gradients = np.column_stack((self.grad_x[rows, cols], self.grad_y[rows, cols]))
+        return self.distance[rows, cols].astype(np.float64), gradients.astype(np.float64)
+
+    @property
+    def empty(self):
+        return not self.shapes
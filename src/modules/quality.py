@@ -0,0 +1,171 @@
+"""Adaptive quality: trades rendering and simulation detail for frame rate.
+
+Rendering and simulation have separate ladders of levels. The controller is
+pygame-free; the GUI feeds it the measured frame and step times, and the
+controller lowers whichever of the two takes most of the frame.
+"""
+import logging
+
+DEFAULT_TARGET_FPS = 60
+
+
+class RenderLevel:
+    """How the school is drawn.
+
+    `fish_lod` is 'circle' (sized circles), 'dot' (small squares) or 'point'
+    (single pixels written through a pixel array).
+    """
+
+    def __init__(self, name, fish_lod, heading_lines):
+        self.name = name
+        self.fish_lod = fish_lod
+        self.heading_lines = heading_lines
+
+
+class SimulationLevel:
+    """How much simulation work goes into a frame.
+
+    `substeps` splits each frame into that many smaller steps. Each fish looks
+    at its neighbours only every `steer_interval` steps, in turns, and keeps
+    its heading in between, so only that share of the school goes through the
+    neighbour search. `cell_limit`, if set, caps how many fish of each
+    neighbour grid cell a fish looks at, so its work stays bounded however
+    dense the school gets. Trails and telemetry are sampled every
+    `analytics_interval` frames.
+    """
+
+    def __init__(self, name, substeps, steer_interval, analytics_interval, cell_limit=None):
+        self.name = name
+        self.substeps = substeps
+        self.steer_interval = steer_interval
+        self.analytics_interval = analytics_interval
+        self.cell_limit = cell_limit
+
+
+# Both ordered from best to cheapest
+RENDER_LEVELS = [
+    RenderLevel('High', 'circle', True),
+    RenderLevel('Low', 'circle', False),
+    RenderLevel('Very low', 'dot', False),
+    RenderLevel('Minimal', 'point', False),
+]
+SIMULATION_LEVELS = [
+    SimulationLevel('High', 2, 1, 1),
+    SimulationLevel('Medium', 1, 1, 1),
+    SimulationLevel('Low', 1, 2, 2),
+    SimulationLevel('Very low', 1, 4, 5, cell_limit=16),
+    SimulationLevel('Minimal', 1, 8, 10, cell_limit=4),
+]
+# Same output as before the controller existed
+DEFAULT_RENDER_LEVEL = 0
+DEFAULT_SIMULATION_LEVEL = 1
+
+# Degrade when frames use more than DEGRADE_LOAD of the budget, upgrade below
+# UPGRADE_LOAD. The gap, and waiting longer before upgrading, keep the levels
+# from oscillating between two neighbours.
+DEGRADE_LOAD = 0.9
+UPGRADE_LOAD = 0.45
+DEGRADE_AFTER = 15
+UPGRADE_AFTER = 120
+
+
+class QualityController:
+    """Holds a target frame rate by moving along RENDER_LEVELS and SIMULATION_LEVELS.
+
+    Frame and step times are smoothed with an exponential moving average. They
+    should only cover the work done in a frame, not the time spent waiting in
+    `clock.tick`, otherwise a fast frame would look exactly on budget.
+    Everything in a frame that is not the step counts as rendering.
+    """
+
+    def __init__(self, target_fps=DEFAULT_TARGET_FPS, render_level=DEFAULT_RENDER_LEVEL,
+                 simulation_level=DEFAULT_SIMULATION_LEVEL, smoothing=0.1):
+        if target_fps <= 0:
+            raise ValueError("Target FPS must be positive")
+        self.target_fps = target_fps
+        self.render_level = render_level
+        self.simulation_level = simulation_level
+        self.smoothing = smoothing
+        self.frame_ms = None
+        self.step_ms = None
+        self.frames_at_level = 0
+
+    @property
+    def render(self):
+        return RENDER_LEVELS[self.render_level]
+
+    @property
+    def simulation(self):
+        return SIMULATION_LEVELS[self.simulation_level]
+
+    @property
+    def name(self):
+        return f"render {self.render.name}, simulation {self.simulation.name}"
+
+    @property
+    def budget_ms(self):
+        return 1000 / self.target_fps
+
+    @property
+    def render_ms(self):
+        return max(self.frame_ms - self.step_ms, 0.0)
+
+    def set_target_fps(self, target_fps):
+        if target_fps <= 0:
+            raise ValueError("Target FPS must be positive")
+        self.target_fps = target_fps
+        self.frames_at_level = 0
+        logging.info(f"Quality target set to {target_fps} FPS")
+
+    def update(self, frame_ms, step_ms=0.0):
+        """Record one frame's work time and return True if a level changed."""
+        if self.frame_ms is None:
+            self.frame_ms, self.step_ms = frame_ms, step_ms
+        else:
+            self.frame_ms += self.smoothing * (frame_ms - self.frame_ms)
+            self.step_ms += self.smoothing * (step_ms - self.step_ms)
+        self.frames_at_level += 1
+
+        load = self.frame_ms / self.budget_ms
+        step_dominates = self.step_ms >= self.render_ms
+        if load > DEGRADE_LOAD and self.frames_at_level >= DEGRADE_AFTER:
+            # Lower the side that costs most, or the other once it is at its cheapest
+            if step_dominates:
+                return self._degrade_simulation() or self._degrade_render()
+            return self._degrade_render() or self._degrade_simulation()
+        if load < UPGRADE_LOAD and self.frames_at_level >= UPGRADE_AFTER:
+            # Raise the cheaper side first, it is the least likely to overshoot
+            if step_dominates:
+                return self._upgrade_render() or self._upgrade_simulation()
+            return self._upgrade_simulation() or self._upgrade_render()
+        return False
+
+    def _degrade_render(self):
+        if self.render_level == len(RENDER_LEVELS) - 1:
+            return False
+        return self._set_levels(self.render_level + 1, self.simulation_level)
+
+    def _degrade_simulation(self):
+        if self.simulation_level == len(SIMULATION_LEVELS) - 1:
+            return False
+        return self._set_levels(self.render_level, self.simulation_level + 1)
+
+    def _upgrade_render(self):
+        if self.render_level == 0:
+            return False
+        return self._set_levels(self.render_level - 1, self.simulation_level)
+
+    def _upgrade_simulation(self):
+        if self.simulation_level == 0:
+            return False
+        return self._set_levels(self.render_level, self.simulation_level - 1)
+
+    def _set_levels(self, render_level, simulation_level):
+        old = self.name
+        self.render_level = render_level
+        self.simulation_level = simulation_level
+        self.frames_at_level = 0
+        logging.info(f"Quality {old} -> {self.name}: frame {self.frame_ms:.1f} ms "
+                     f"(step {self.step_ms:.1f} ms, render {self.render_ms:.1f} ms), "
+                     f"budget {self.budget_ms:.1f} ms at {self.target_fps} FPS")
+        return True
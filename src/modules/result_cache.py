@@ -0,0 +1,181 @@
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def config_key(config):
+    """Hash a JSON-serializable configuration into a stable cache key."""
+    canonical = json.dumps(config, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def code_version(paths):
+    """Digest of the source files whose changes invalidate cached results."""
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        digest.update(os.path.basename(path).encode('utf-8'))
+        digest.update(file_digest(path).encode('ascii'))
+    return digest.hexdigest()[:16]
+
+
+class ResultCache:
+    """Content-addressed store of experience results.
+
+    Each entry lives in `<root>/<key>/` and is described in `manifest.json`, so
+    entries can be listed and queried without scanning the directory. The least
+    recently used entries are evicted once the entry count or total size limit
+    is exceeded. Several experience workers may share the same cache directory,
+    so every operation re-reads the manifest while holding `manifest.lock`.
+    """
+
+    def __init__(self, root='./cache/', max_entries=50, max_bytes=500 * 1024 * 1024):
+        self.root = root
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.manifest_path = os.path.join(root, 'manifest.json')
+        self.lock_path = os.path.join(root, 'manifest.lock')
+        self.manifest = self._load_manifest()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Hold the cache lock around a read-modify-write of the manifest."""
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.lock_path, 'a+b') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            else:
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+                else:
+                    lock.seek(0)
+                    msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'entries': {}}
+        except (OSError, ValueError):
+            # A corrupted manifest only costs recomputation
+            return {'entries': {}}
+
+    def _save_manifest(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f'{self.manifest_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def get(self, config):
+        """Return the cached file paths for a configuration, or None on a miss."""
+        key = config_key(config)
+        with self._locked():
+            self.manifest = self._load_manifest()
+            entry = self.manifest['entries'].get(key)
+            if entry is None:
+                return None
+
+            paths = [os.path.join(self.root, key, name) for name in entry['files']]
+            if not all(os.path.exists(path) for path in paths):
+                self._remove(key)
+                self._save_manifest()
+                return None
+
+            entry['last_access'] = time.time()
+            entry['hits'] = entry.get('hits', 0) + 1
+            self._save_manifest()
+            return paths
+
+    def put(self, config, files):
+        """Copy result files into the cache and return their cached paths.
+
+        Results larger than `max_bytes` are not cached and None is returned.
+        """
+        size = sum(os.path.getsize(path) for path in files)
+        if size > self.max_bytes:
+            return None
+
+        key = config_key(config)
+        entry_dir = os.path.join(self.root, key)
+        # Copied under the lock too, since eviction removes directories missing from the manifest
+        with self._locked():
+            os.makedirs(entry_dir, exist_ok=True)
+            names = []
+            for path in files:
+                name = os.path.basename(path)
+                shutil.copy2(path, os.path.join(entry_dir, name))
+                names.append(name)
+
+            now = time.time()
+            self.manifest = self._load_manifest()
+            self.manifest['entries'][key] = {
+                'config': config,
+                'files': names,
+                'size': size,
+                'created': now,
+                'last_access': now,
+                'hits': 0,
+            }
+            self.evict(keep=key)
+            self._save_manifest()
+        return [os.path.join(entry_dir, name) for name in names]
+
+    def entries(self, **filters):
+        """List (key, entry) pairs whose configuration matches every filter."""
+        self.manifest = self._load_manifest()
+        return [(key, entry) for key, entry in self.manifest['entries'].items()
+                if all(entry['config'].get(name) == value for name, value in filters.items())]
+
+    def total_size(self):
+        return sum(entry['size'] for entry in self.manifest['entries'].values())
+
+    def evict(self, keep=None):
+        """Remove least recently used entries, other than `keep`, until within the limits.
+
+        Entry directories missing from the manifest, left by an interrupted
+        put, are removed as well. Call with the lock held.
+        """
+        entries = self.manifest['entries']
+        by_age = sorted((key for key in entries if key != keep), key=lambda key: entries[key]['last_access'])
+        while by_age and (len(entries) > self.max_entries or self.total_size() > self.max_bytes):
+            self._remove(by_age.pop(0))
+        for name in os.listdir(self.root):
+            if name not in entries and os.path.isdir(os.path.join(self.root, name)):
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    def _remove(self, key):
+        self.manifest['entries'].pop(key, None)
+        shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+
+
+if __name__ == '__main__':
+    cache = ResultCache()
+    for key, entry in sorted(cache.entries(), key=lambda item: item[1]['last_access'], reverse=True):
+        config = entry['config']
+        print(f"{key[:12]}  {config.get('experience_type')}  fish={config.get('fish_count')}  "
+              f"steps={config.get('steps')}  seed={config.get('seed')}  "
+              f"{entry['size'] / 1024:.0f} KiB  hits={entry.get('hits', 0)}")
+    print(f'{len(cache.entries())} entries, {cache.total_size() / (1024 * 1024):.1f} MiB')
@@ -0,0 +1,806 @@
+"""Simulation core: fish, predators, spatial index and checkpoints.
+
+Importing this module has no side effects; it does not load pygame or open a
+window, so it can be used from the GUI, headless runs and worker processes.
+"""
+import logging
+import os
+import random
+
+import numpy as np
+
+from modules.vector_v1 import Vector
+from modules.obstacles import ObstacleField
+from modules.checkpoint import save_checkpoint, load_checkpoint, set_rng_state
+
+# Screen dimensions
+WIDTH, HEIGHT = 1200, 800
+
+fish_count = 5
+boundary_behavior_enabled = False
+predator_count = 3
+predators_enabled = False
+obstacles_enabled = False
+open_population_enabled = False
+mixed_species_enabled = False
+
+# Flocking weights and radii
+SEPARATION_WEIGHT = 0.03
+ALIGNMENT_WEIGHT = 0.05
+COHESION_WEIGHT = 0.03
+AVOIDANCE_WEIGHT = 0.2
+FLEE_WEIGHT = 0.1
+NEIGHBOUR_RADIUS = 75
+SEPARATION_RADIUS = 25
+
+# Steering radii for the obstacle and predator terms
+OBSTACLE_AVOID_RADIUS = 30
+PREDATOR_FLEE_RADIUS = 120
+PREDATOR_HUNT_RADIUS = 150
+PREDATOR_CONTACT_RADIUS = 40
+
+# Checkpoints: warm starts skip the burn-in while schools form, autosaves allow resuming
+CHECKPOINT_DIR = "./checkpoints/"
+WARM_START_STEPS = 600
+AUTOSAVE_INTERVAL = 600
+
+# Open population: fish reaching the sink are removed and new ones enter through
+# the source, up to fish_count, at most SPAWN_PER_STEP per step
+SOURCE_WIDTH = 40
+SINK_WIDTH = 40
+SPAWN_PER_STEP = 1
+
+class Species:
+    """Appearance, speed distribution and steering parameters of one kind of fish.
+
+    `color` holds an inclusive (low, high) range per RGB channel; `speed` and
+    `size` are (low, high) ranges drawn uniformly when a fish is created.
+    """
+
+    def __init__(self, name, color=((0, 0), (100, 255), (200, 255)), speed=(1.5, 2.5), size=(3, 7),
+                 separation_radius=SEPARATION_RADIUS, neighbour_radius=NEIGHBOUR_RADIUS,
+                 separation_weight=SEPARATION_WEIGHT, alignment_weight=ALIGNMENT_WEIGHT,
+                 cohesion_weight=COHESION_WEIGHT, flee_weight=FLEE_WEIGHT):
+        self.name = name
+        self.index = 0  # Position in its SpeciesTable
+        self.color = color
+        self.speed = speed
+        self.size = size
+        self.separation_radius = separation_radius
+        self.neighbour_radius = neighbour_radius
+        self.separation_weight = separation_weight
+        self.alignment_weight = alignment_weight
+        self.cohesion_weight = cohesion_weight
+        self.flee_weight = flee_weight
+
+    def describe(self):
+        return {name: value for name, value in vars(self).items() if name != 'index'}
+
+class SpeciesTable:
+    """The species in a tank, their share of the school and how they react to each other.
+
+    Entry [i, j] of the `separation`, `alignment` and `cohesion` matrices
+    scales how a fish of species i responds to a neighbour of species j. By
+    default fish keep their distance from everyone but only school with their
+    own species.
+    """
+
+    def __init__(self, species, mix=None, separation=None, alignment=None, cohesion=None):
+        count = len(species)
+        self.species = species
+        for index, kind in enumerate(species):
+            kind.index = index
+        self.mix = np.asarray(mix if mix is not None else np.ones(count), dtype=np.float64)
+        self.mix = self.mix / self.mix.sum()
+        self.separation = np.asarray(separation if separation is not None else np.ones((count, count)), dtype=np.float64)
+        self.alignment = np.asarray(alignment if alignment is not None else np.eye(count), dtype=np.float64)
+        self.cohesion = np.asarray(cohesion if cohesion is not None else np.eye(count), dtype=np.float64)
+
+    def __len__(self):
+        return len(self.species)
+
+    def __getitem__(self, index):
+        return self.species[index]
+
+    def describe(self):
+        return {
+            'species': [kind.describe() for kind in self.species],
+            'mix': self.mix.tolist(),
+            'separation': self.separation.tolist(),
+            'alignment': self.alignment.tolist(),
+            'cohesion': self.cohesion.tolist(),
+        }
+
+# One species with the original behaviour, and a mixed tank
+SINGLE_SPECIES = SpeciesTable([Species('fish')])
+MIXED_SPECIES = SpeciesTable(
+    [
+        Species('sardine', color=((150, 190), (170, 210), (200, 235)), speed=(2.2, 2.8), size=(2, 4),
+                separation_radius=15, neighbour_radius=60, alignment_weight=0.08, cohesion_weight=0.05),
+        Species('mackerel', color=((0, 40), (120, 180), (90, 150)), speed=(1.8, 2.4), size=(4, 7),
+                separation_radius=30, neighbour_radius=90),
+        Species('tang', color=((230, 255), (200, 235), (0, 40)), speed=(1.0, 1.6), size=(5, 8),
+                separation_radius=25, neighbour_radius=50, alignment_weight=0.01, cohesion_weight=0.01,
+                flee_weight=0.2),
+    ],
+    mix=[0.5, 0.3, 0.2],
+    # Sardines give the larger fish a wide berth; mackerel loosely follow sardine schools
+    separation=[[1.0, 2.0, 2.0], [1.0, 1.0, 1.0], [0.5, 1.0, 1.0]],
+    alignment=[[1.0, 0.0, 0.0], [0.3, 1.0, 0.0], [0.0, 0.0, 1.0]],
+    cohesion=[[1.0, 0.0, 0.0], [0.2, 1.0, 0.0], [0.0, 0.0, 1.0]],
+)
+
+def species_table():
+    return MIXED_SPECIES if mixed_species_enabled else SINGLE_SPECIES
+
+def _uniform_int(low, high):
+    # Fixed channels don't draw, so the default species consumes random numbers as before
+    return low if low == high else random.randint(low, high)
+
+class Fish:
+    def __init__(self, id, species=None):
+        self.id = id
+        self.species = species if species is not None else SINGLE_SPECIES[0]
+        self.reset()
+
+    def reset(self, species=None):
+        """Give the fish a new random state; used when a pool slot is reused."""
+        if species is not None:
+            self.species = species
+        kind = self.species
+        self.speed = random.uniform(*kind.speed)
+        self.direction = Vector(random.uniform(-1, 1), random.uniform(-1, 1)).normalize()
+        self.pos = Vector(random.randint(0, WIDTH), random.randint(0, HEIGHT))
+        self.color = tuple(_uniform_int(low, high) for low, high in kind.color)
+        self.trajectory = []
+        self.size = random.randint(*kind.size)
+
+class Predator:
+    def __init__(self, id):
+        self.id = id
+        self.speed = random.uniform(2.0, 2.4)
+        self.direction = Vector(random.uniform(-1, 1), random.uniform(-1, 1)).normalize()
+        self.pos = Vector(random.randint(0, WIDTH), random.randint(0, HEIGHT))
+        self.color = (200, 30, 30)
+        self.size = 9
+
+    def move(self, quadtree, obstacles=None, dt=1.0):
+        """Chase the nearest fish in range and return the prey seen this step."""
+        prey = quadtree.query(self.pos.x, self.pos.y, PREDATOR_HUNT_RADIUS)
+
+        steering = Vector(0, 0)
+        if prey:
+            target = min(prey, key=lambda fish: (fish.pos - self.pos).norm)
+            steering = (target.pos - self.pos).normalize()
+        avoidance = avoid_obstacles(self.pos, obstacles)
+
+        self.direction = (self.direction + steering * (0.08 * dt) + avoidance * (AVOIDANCE_WEIGHT * dt)).normalize()
+        self.pos += self.direction * (self.speed * dt)
+
+        apply_boundaries(self, obstacles)
+        return prey
+
+def avoid_obstacles(pos, obstacles):
+    """Steer along the distance field gradient when close to an obstacle."""
+    if obstacles is None:
+        return Vector(0, 0)
+    distance, grad_x, grad_y = obstacles.sample(pos.x, pos.y)
+    if distance >= OBSTACLE_AVOID_RADIUS:
+        return Vector(0, 0)
+    return Vector(grad_x, grad_y) * (1 - distance / OBSTACLE_AVOID_RADIUS)
+
+def apply_boundaries(entity, obstacles=None):
+    if obstacles is not None:
+        # Push back out of an obstacle that was entered this step
+        distance, grad_x, grad_y = obstacles.sample(entity.pos.x, entity.pos.y)
+        if distance < 0:
+            entity.pos += Vector(grad_x, grad_y) * -distance
+
+    if boundary_behavior_enabled:
+        if entity.pos.x <= 0 or entity.pos.x >= WIDTH:
+            entity.direction.x *= -1
+        if entity.pos.y <= 0 or entity.pos.y >= HEIGHT:
+            entity.direction.y *= -1
+    else:
+        entity.pos.x %= WIDTH
+        entity.pos.y %= HEIGHT
+
+class QuadTree:
+    def __init__(self, boundary, capacity):
+        self.boundary = boundary
+        self.capacity = capacity
+        self.fishes = []
+        self.divided = False
+        self.northwest = None
+        self.northeast = None
+        self.southwest = None
+        self.southeast = None
+
+    def insert(self, fish):
+        if not self.boundary.contains(fish.pos):
+            return False
+
+        if len(self.fishes) < self.capacity:
+            self.fishes.append(fish)
+            return True
+
+        if not self.divided:
+            self.subdivide()
+
+        return (self.northwest.insert(fish) or
+                self.northeast.insert(fish) or
+                self.southwest.insert(fish) or
+                self.southeast.insert(fish))
+
+    def subdivide(self):
+        x, y = self.boundary.x, self.boundary.y
+        w, h = self.boundary.w / 2, self.boundary.h / 2
+
+        self.northwest = QuadTree(Rectangle(x, y, w, h), self.capacity)
+        self.northeast = QuadTree(Rectangle(x + w, y, w, h), self.capacity)
+        self.southwest = QuadTree(Rectangle(x, y + h, w, h), self.capacity)
+        self.southeast = QuadTree(Rectangle(x + w, y + h, w, h), self.capacity)
+
+        self.divided = True
+
+    def query(self, x, y, radius):
+        result = []
+        if not self.boundary.intersects(Circle(x, y, radius)):
+            return result
+
+        for fish in self.fishes:
+            if (fish.pos.x - x)**2 + (fish.pos.y - y)**2 <= radius**2:
+                result.append(fish)
+
+        if self.divided:
+            result.extend(self.northwest.query(x, y, radius))
+            result.extend(self.northeast.query(x, y, radius))
+            result.extend(self.southwest.query(x, y, radius))
+            result.extend(self.southeast.query(x, y, radius))
+
+        return result
+
+class Rectangle:
+    def __init__(self, x, y, w, h):
+        self.x = x
+        self.y = y
+        self.w = w
+        self.h = h
+
+    def contains(self, point):
+        return (self.x <= point.x < self.x + self.w and
+                self.y <= point.y < self.y + self.h)
+
+    def intersects(self, circle):
+        dx = abs(circle.x - (self.x + self.w/2))
+        dy = abs(circle.y - (self.y + self.h/2))
+
+        if dx > (self.w/2 + circle.r): return False
+        if dy > (self.h/2 + circle.r): return False
+
+        if dx <= (self.w/2): return True
+        if dy <= (self.h/2): return True
+
+        corner_distance_sq = (dx - self.w/2)**2 + (dy - self.h/2)**2
+
+        return corner_distance_sq <= (circle.r**2)
+
+class Circle:
+    def __init__(self, x, y, r):
+        self.x = x
+        self.y = y
+        self.r = r
+
+class FishPool:
+    """School storage with preallocated slots and a free list.
+
+    A fish's id is its slot index, so ids stay stable while other fish come and
+    go. Removed fish go back on the free list and are reset in place when their
+    slot is reused; changing the population only touches the difference and
+    never rebuilds or disturbs the fish that remain. Iterating the pool yields
+    the live fish.
+
+    The slot list and the `alive` mask are preallocated and grow by doubling.
+    Fish state itself stays in Fish objects; flocking_steering gathers it into
+    arrays once per step.
+
+    Live fish are kept sorted by species: group g occupies
+    `fishes[starts[g]:starts[g + 1]]`, so steering and analytics can run one
+    species at a time. Adding or removing a fish moves at most one fish per
+    species to keep the groups contiguous.
+    """
+
+    def __init__(self, capacity=64, table=None):
+        self.table = table if table is not None else SINGLE_SPECIES
+        self.slots = []
+        self.alive = np.zeros(0, dtype=bool)
+        self.free = []
+        self.fishes = []
+        self.starts = [0] * (len(self.table) + 1)
+        self._index = {}  # fish id -> position in self.fishes
+        self.reserve(capacity)
+
+    @property
+    def capacity(self):
+        return len(self.slots)
+
+    def reserve(self, capacity):
+        old = self.capacity
+        if capacity <= old:
+            return
+        self.slots.extend([None] * (capacity - old))
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:old] = self.alive
+        self.alive = alive
+        # The free list is a stack: keep the lowest slots on top
+        self.free[:0] = range(capacity - 1, old - 1, -1)
+
+    def group(self, index):
+        return self.fishes[self.starts[index]:self.starts[index + 1]]
+
+    def groups(self):
+        """Yield (species, fish of that species) for every species in the table."""
+        for kind in self.table.species:
+            yield kind, self.group(kind.index)
+
+    def group_sizes(self):
+        return np.diff(self.starts)
+
+    def spawn(self, region=None, species=None):
+        """Add a fish, optionally placed at random inside a Rectangle.
+
+        Without a species, the one furthest below its share of the mix is used.
+        """
+        if species is None:
+            shortfall = self.table.mix * (len(self.fishes) + 1) - self.group_sizes()
+            species = self.table[int(np.argmax(shortfall))]
+        if not self.free:
+            self.reserve(max(2 * self.capacity, 1))
+        slot = self.free.pop()
+        fish = self.slots[slot]
+        if fish is None:
+            fish = Fish(id=slot, species=species)
+            self.slots[slot] = fish
+        else:
+            fish.reset(species)
+        if region is not None:
+            fish.pos = Vector(random.uniform(region.x, region.x + region.w),
+                              random.uniform(region.y, region.y + region.h))
+        self._insert(fish)
+        return fish
+
+    def add(self, fish):
+        """Place an existing fish in the slot matching its id."""
+        self.extend([fish])
+
+    def extend(self, fishes):
+        """Place existing fish in the slots matching their ids.
+
+        The free list is rebuilt once afterwards, so restoring a whole school
+        is linear in the capacity.
+        """
+        for fish in fishes:
+            self.reserve(max(fish.id + 1, self.capacity))
+            if self.alive[fish.id]:
+                raise ValueError(f"Fish slot {fish.id} is already in use")
+            self.slots[fish.id] = fish
+            self._insert(fish)
+        self.free = np.flatnonzero(~self.alive)[::-1].tolist()
+
+    def despawn(self, fish):
+        # Fill the hole with the last fish of the group, then carry the hole
+        # through the following groups to the end of the list
+        hole = self._index.pop(fish.id)
+        for group in range(fish.species.index, len(self.table)):
+            last = self.starts[group + 1] - 1
+            if last != hole:
+                moved = self.fishes[last]
+                self.fishes[hole] = moved
+                self._index[moved.id] = hole
+            hole = last
+            self.starts[group + 1] -= 1
+        self.fishes.pop()
+        self.alive[fish.id] = False
+        self.free.append(fish.id)
+
+    def resize(self, count):
+        """Add or remove fish until the school has `count` members, keeping the species mix."""
+        while len(self.fishes) < count:
+            self.spawn()
+        while len(self.fishes) > count:
+            excess = self.group_sizes() - self.table.mix * (len(self.fishes) - 1)
+            group = int(np.argmax(excess))
+            self.despawn(self.fishes[self.starts[group + 1] - 1])
+
+    def _insert(self, fish):
+        # Open a hole at the end of the fish's group by moving the first fish of
+        # each following group to the end of that group
+        self.alive[fish.id] = True
+        self.fishes.append(fish)
+        hole = len(self.fishes) - 1
+        for group in range(len(self.table) - 1, fish.species.index, -1):
+            first = self.starts[group]
+            if first != hole:  # Otherwise the group is empty
+                moved = self.fishes[first]
+                self.fishes[hole] = moved
+                self._index[moved.id] = hole
+            self.starts[group] = first + 1
+            hole = first
+        self.fishes[hole] = fish
+        self._index[fish.id] = hole
+        self.starts[-1] += 1
+
+    def __len__(self):
+        return len(self.fishes)
+
+    def __iter__(self):
+        return iter(self.fishes)
+
+def create_fish(nb: int):
+    fishes = FishPool(capacity=nb, table=species_table())
+    fishes.resize(nb)
+    from termcolor import colored
+    print(colored("🐟 @fcv1.0 ", "blue") + "process complete!")
+    return fishes
+
+def create_predators(nb: int):
+    return [Predator(id=i) for i in range(nb)]
+
+def create_obstacles():
+    # Rasterized once; every later lookup is a single array access
+    field = ObstacleField(WIDTH, HEIGHT)
+    field.add_walls()
+    field.add_circle(300, 250, 60)
+    field.add_circle(850, 550, 80)
+    field.add_circle(950, 200, 40)
+    field.add_rectangle(500, 450, 200, 30)
+    return field.build()
+
+def build_quadtree(entities):
+    quadtree = QuadTree(Rectangle(0, 0, WIDTH, HEIGHT), 4)
+    for entity in entities:
+        quadtree.insert(entity)
+    return quadtree
+
+class NeighbourGrid:
+    """Fish positions bucketed into square cells for vectorized radius queries.
+
+    Only fish inside the tank are candidates, as with the quadtree. Queries
+    must use a radius of at most `cell`, so the 3x3 cells around a position
+    hold every neighbour. With a `cell_limit`, at most that many fish of each
+    cell are looked at, which bounds the work per fish in dense schools; the
+    fish of a cell are then kept in a scrambled order so the sample mixes
+    species, and each sampled pair is weighted to stand for the whole cell.
+    """
+
+    OFFSETS = np.array([(dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1)])
+
+    def __init__(self, positions, cell, cell_limit=None):
+        self.positions = positions
+        self.cell = cell
+        self.cell_limit = cell_limit
+        self.cols = int(np.ceil(WIDTH / cell))
+        self.rows = int(np.ceil(HEIGHT / cell))
+        x, y = positions[:, 0], positions[:, 1]
+        candidates = np.flatnonzero((x >= 0) & (x < WIDTH) & (y >= 0) & (y < HEIGHT))
+        cells = self.cells(positions[candidates])
+        if cell_limit is None:
+            order = np.argsort(cells, kind='stable')
+        else:
+            order = np.argsort(cells * 2 ** 32 + candidates * 2654435761 % 2 ** 32)
+        self.members = candidates[order]
+        bounds = np.searchsorted(cells[order], np.arange(self.rows * self.cols + 1))
+        self.first, self.count = bounds[:-1], np.diff(bounds)
+
+    def cells(self, positions):
+        cols = np.clip(positions[:, 0] // self.cell, 0, self.cols - 1).astype(np.int64)
+        rows = np.clip(positions[:, 1] // self.cell, 0, self.rows - 1).astype(np.int64)
+        return rows * self.cols + cols
+
+    def pairs(self, queries, radius, batch=1 << 20):
+        """Yield (query, neighbour, weight) arrays for every pair within `radius`.
+
+        `query` indexes into `queries`. `weight` is 1 unless the neighbour's
+        cell was sampled. Pairs come in batches of about `batch` candidates so
+        memory stays bounded in dense schools.
+        """
+        cells = self.cells(self.positions[queries])
+        cols = cells[:, np.newaxis] % self.cols + self.OFFSETS[:, 0]
+        rows = cells[:, np.newaxis] // self.cols + self.OFFSETS[:, 1]
+        valid = (cols >= 0) & (cols < self.cols) & (rows >= 0) & (rows < self.rows)
+        neighbour_cells = np.where(valid, rows * self.cols + cols, 0)
+        first = self.first[neighbour_cells]
+        full = np.where(valid, self.count[neighbour_cells], 0)
+        count = full if self.cell_limit is None else np.minimum(full, self.cell_limit)
+        scale = full / np.maximum(count, 1)
+
+        ends = np.cumsum(count.sum(axis=1))
+        start = 0
+        while start < len(queries):
+            done = ends[start - 1] if start else 0
+            stop = max(int(np.searchsorted(ends, done + batch, side='right')), start + 1)
+            counts, firsts = count[start:stop].ravel(), first[start:stop].ravel()
+            query = np.repeat(np.repeat(np.arange(start, stop), len(self.OFFSETS)), counts)
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            neighbour = self.members[np.repeat(firsts, counts) + offsets]
+            weight = np.repeat(scale[start:stop].ravel(), counts)
+            diff = self.positions[neighbour] - self.positions[queries[query]]
+            near = ((diff ** 2).sum(axis=1) <= radius ** 2) & (neighbour != queries[query])
+            yield query[near], neighbour[near], weight[near]
+            start = stop
+
+def _normalize_rows(vectors):
+    norms = np.hypot(vectors[:, 0], vectors[:, 1])[:, np.newaxis]
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms != 0)
+
+def school_arrays(fishes):
+    """Positions, headings and speeds of the live fish, in pool order."""
+    state = np.array([(fish.pos.x, fish.pos.y, fish.direction.x, fish.direction.y, fish.speed) for fish in fishes],
+                     dtype=np.float64).reshape(-1, 5)
+    return state[:, :2], state[:, 2:4], state[:, 4]
+
+def flocking_steering(fishes, positions, headings, dt=1.0, flock=None, cell_limit=None):
+    """Weighted separation, alignment and cohesion of every live fish, in pool order.
+
+    All fish steer from the positions and headings at the start of the step.
+    Each species group is evaluated at once with numpy, using its radii and
+    weights and its rows of the interaction matrices. `flock` optionally
+    scales each fish's term; fish with 0 are not evaluated. `cell_limit`
+    caps the neighbours sampled per grid cell, see NeighbourGrid.
+    """
+    table = fishes.table
+    kinds = np.repeat(np.arange(len(table)), fishes.group_sizes())
+    steering = np.zeros((len(positions), 2))
+    if not len(positions):
+        return steering
+    grid = NeighbourGrid(positions, max(kind.neighbour_radius for kind in table.species), cell_limit)
+    close_grid = None
+    if cell_limit is not None:
+        # Separation reacts to the few closest fish, which a coarse sample mostly
+        # misses, so it samples a grid of its own, finer radius more generously
+        close_grid = NeighbourGrid(positions, max(kind.separation_radius for kind in table.species),
+                                   cell_limit * 4)
+
+    for kind in table.species:
+        members = np.arange(fishes.starts[kind.index], fishes.starts[kind.index + 1])
+        if flock is not None:
+            members = members[flock[members] != 0]
+        if not len(members):
+            continue
+        separation = np.zeros((len(members), 2))
+        alignment = np.zeros((len(members), 2))
+        cohesion = np.zeros((len(members), 2))
+        alignment_count = np.zeros(len(members))
+        cohesion_count = np.zeros(len(members))
+        for query, neighbour, sampled in grid.pairs(members, kind.neighbour_radius):
+            others = kinds[neighbour]
+            if close_grid is None:
+                separation += _separation(positions, members, query, neighbour, kind, table.separation[kind.index, others])
+            weight = table.alignment[kind.index, others] * sampled
+            alignment += _sum_rows(query, headings[neighbour] * weight[:, np.newaxis], len(members))
+            alignment_count += np.bincount(query, weight, len(members))
+            weight = table.cohesion[kind.index, others] * sampled
+            cohesion += _sum_rows(query, positions[neighbour] * weight[:, np.newaxis], len(members))
+            cohesion_count += np.bincount(query, weight, len(members))
+        if close_grid is not None:
+            for query, neighbour, sampled in close_grid.pairs(members, kind.separation_radius):
+                weight = table.separation[kind.index, kinds[neighbour]] * sampled
+                separation += _separation(positions, members, query, neighbour, kind, weight)
+
+        aligned = alignment_count > 0
+        alignment[aligned] = _normalize_rows(alignment[aligned] / alignment_count[aligned, np.newaxis])
+        alignment[~aligned] = 0
+        cohering = cohesion_count > 0
+        cohesion[cohering] = _normalize_rows(cohesion[cohering] / cohesion_count[cohering, np.newaxis]
+                                             - positions[members[cohering]])
+        cohesion[~cohering] = 0
+
+        term = (separation * (kind.separation_weight * dt) + alignment * (kind.alignment_weight * dt)
+                + cohesion * (kind.cohesion_weight * dt))
+        if flock is not None:
+            term *= flock[members, np.newaxis]
+        steering[members] = term
+    return steering
+
+def _separation(positions, members, query, neighbour, kind, weight):
+    """Summed push of each member away from the given neighbours inside its separation radius."""
+    away = positions[members[query]] - positions[neighbour]
+    distance = np.hypot(away[:, 0], away[:, 1])
+    close = (distance < kind.separation_radius) & (distance > 0)
+    push = away[close] / distance[close, np.newaxis] * weight[close, np.newaxis]
+    return _sum_rows(query[close], push, len(members))
+
+def _sum_rows(index, values, count):
+    return np.column_stack((np.bincount(index, values[:, 0], count), np.bincount(index, values[:, 1], count)))
+
+def move_school(fishes, positions, headings, speeds, steering, predators, obstacles, dt=1.0, record_trails=True):
+    """Turn and advance every live fish at once, then write the result back to the Fish objects.
+
+    Applies obstacle avoidance, fleeing and the tank boundaries the way
+    avoid_obstacles and apply_boundaries do for a single predator.
+    """
+    table = fishes.table
+    flee_weights = np.repeat([kind.flee_weight for kind in table.species], fishes.group_sizes())
+    direction = headings + steering
+    if obstacles is not None:
+        distance, gradients = obstacles.sample_many(positions)
+        weight = np.where(distance < OBSTACLE_AVOID_RADIUS, 1 - distance / OBSTACLE_AVOID_RADIUS, 0)
+        direction += gradients * (weight * (AVOIDANCE_WEIGHT * dt))[:, np.newaxis]
+    flee = np.zeros_like(positions)
+    for predator in predators:
+        if not (0 <= predator.pos.x < WIDTH and 0 <= predator.pos.y < HEIGHT):
+            continue  # Outside the predator quadtree the fish used to query
+        away = positions - (predator.pos.x, predator.pos.y)
+        distance = np.hypot(away[:, 0], away[:, 1])
+        near = (distance <= PREDATOR_FLEE_RADIUS) & (distance > 0)
+        # Closer predators weigh more
+        flee[near] += away[near] / distance[near, np.newaxis] * (1 - distance[near, np.newaxis] / PREDATOR_FLEE_RADIUS)
+    direction += flee * (flee_weights * dt)[:, np.newaxis]
+
+    # dt scales both steering and distance, so smaller substeps cover the same ground
+    direction = _normalize_rows(direction)
+    positions = positions + direction * (speeds * dt)[:, np.newaxis]
+
+    if obstacles is not None:
+        # Push back out of an obstacle that was entered this step
+        distance, gradients = obstacles.sample_many(positions)
+        inside = distance < 0
+        positions[inside] -= gradients[inside] * distance[inside, np.newaxis]
+    if boundary_behavior_enabled:
+        direction[(positions[:, 0] <= 0) | (positions[:, 0] >= WIDTH), 0] *= -1
+        direction[(positions[:, 1] <= 0) | (positions[:, 1] >= HEIGHT), 1] *= -1
+    else:
+        positions %= (WIDTH, HEIGHT)
+
+    for fish, (x, y, dx, dy) in zip(fishes, np.column_stack((positions, direction)).tolist()):
+        fish.pos = Vector(x, y)
+        fish.direction = Vector(dx, dy)
+        if record_trails:
+            fish.trajectory.append((int(x), int(y)))
+            if len(fish.trajectory) > 100:
+                fish.trajectory.pop(0)
+
+def record_interactions(interactions, frame, predator, prey):
+    """Store (frame, predator id, fish in contact, nearest fish distance)."""
+    nearest = min(((fish.pos - predator.pos).norm for fish in prey), default=PREDATOR_HUNT_RADIUS)
+    contacts = sum(1 for fish in prey if (fish.pos - predator.pos).norm <= PREDATOR_CONTACT_RADIUS)
+    interactions.append((frame, predator.id, contacts, nearest))
+
+def step_population(fishes):
+    """Despawn fish inside the sink and spawn new ones in the source; return the new fish."""
+    sink = Rectangle(WIDTH - SINK_WIDTH, 0, SINK_WIDTH, HEIGHT)
+    for fish in [fish for fish in fishes if sink.contains(fish.pos)]:
+        fishes.despawn(fish)
+
+    source = Rectangle(0, 0, SOURCE_WIDTH, HEIGHT)
+    spawned = []
+    while len(fishes) < fish_count and len(spawned) < SPAWN_PER_STEP:
+        spawned.append(fishes.spawn(source))
+    return spawned
+
+def step_simulation(fishes, predators, obstacles, frame=0, interactions=None, dt=1.0, record_trails=True,
+                    steer_interval=1, populate=True, cell_limit=None):
+    """Advance by dt steps and return the fish spawned by the open population, if any.
+
+    With a `steer_interval` above 1 each fish flocks only on every that many
+    frames, staggered by id, with the neighbour terms scaled up to match.
+    `cell_limit` caps the neighbours sampled per grid cell.
+    When a frame is split into substeps, only one of them should `populate`,
+    so the spawn rate doesn't depend on the substep count.
+    """
+    spawned = step_population(fishes) if open_population_enabled and populate else []
+
+    if predators:
+        # Predators hunt through the quadtree; fish find their neighbours with a NeighbourGrid
+        quadtree = build_quadtree(fishes)
+        for predator in predators:
+            prey = predator.move(quadtree, obstacles, dt)
+            if prey and interactions is not None:
+                record_interactions(interactions, frame, predator, prey)
+
+    positions, headings, speeds = school_arrays(fishes)
+    flock = None
+    if steer_interval > 1:
+        ids = np.fromiter((fish.id for fish in fishes), dtype=np.int64, count=len(fishes))
+        flock = np.where((ids + frame) % steer_interval == 0, steer_interval, 0)
+    steering = flocking_steering(fishes, positions, headings, dt, flock, cell_limit)
+    move_school(fishes, positions, headings, speeds, steering, predators, obstacles, dt, record_trails)
+    return spawned
+
+def snapshot_state(fishes, predators):
+    """Pack the school and predators into arrays for a checkpoint."""
+    arrays = {
+        'fish_id': np.array([fish.id for fish in fishes], dtype=np.int32),
+        'fish_pos': np.array([(fish.pos.x, fish.pos.y) for fish in fishes], dtype=np.float64).reshape(-1, 2),
+        'fish_direction': np.array([(fish.direction.x, fish.direction.y) for fish in fishes], dtype=np.float64).reshape(-1, 2),
+        'fish_speed': np.array([fish.speed for fish in fishes], dtype=np.float64),
+        'fish_size': np.array([fish.size for fish in fishes], dtype=np.int16),
+        'fish_color': np.array([fish.color for fish in fishes], dtype=np.uint8).reshape(-1, 3),
+        'fish_species': np.array([fish.species.index for fish in fishes], dtype=np.int16),
+        'predator_id': np.array([p.id for p in predators], dtype=np.int32),
+        'predator_pos': np.array([(p.pos.x, p.pos.y) for p in predators], dtype=np.float64).reshape(-1, 2),
+        'predator_direction': np.array([(p.direction.x, p.direction.y) for p in predators], dtype=np.float64).reshape(-1, 2),
+        'predator_speed': np.array([p.speed for p in predators], dtype=np.float64),
+    }
+    params = {
+        'width': WIDTH,
+        'height': HEIGHT,
+        'fish_count': len(fishes),
+        'boundary_behavior_enabled': boundary_behavior_enabled,
+        'predators_enabled': bool(predators),
+        'obstacles_enabled': obstacles_enabled,
+        'open_population_enabled': open_population_enabled,
+        'mixed_species_enabled': fishes.table is MIXED_SPECIES,
+    }
+    return arrays, params
+
+def restore_state(arrays, table=SINGLE_SPECIES):
+    """Rebuild the fish pool and predators from checkpoint arrays."""
+    fishes = FishPool(capacity=int(arrays['fish_id'].max()) + 1 if len(arrays['fish_id']) else 1, table=table)
+    # Checkpoints from before species existed hold a single species
+    fish_species = arrays.get('fish_species', np.zeros(len(arrays['fish_id']), dtype=np.int16))
+    school = []
+    for i, fish_id in enumerate(arrays['fish_id']):
+        fish = Fish(id=int(fish_id), species=table[int(fish_species[i])])
+        fish.pos = Vector(*arrays['fish_pos'][i])
+        fish.direction = Vector(*arrays['fish_direction'][i])
+        fish.speed = float(arrays['fish_speed'][i])
+        fish.size = int(arrays['fish_size'][i])
+        fish.color = tuple(int(c) for c in arrays['fish_color'][i])
+        school.append(fish)
+    fishes.extend(school)
+
+    predators = []
+    for i, predator_id in enumerate(arrays['predator_id']):
+        predator = Predator(id=int(predator_id))
+        predator.pos = Vector(*arrays['predator_pos'][i])
+        predator.direction = Vector(*arrays['predator_direction'][i])
+        predator.speed = float(arrays['predator_speed'][i])
+        predators.append(predator)
+    return fishes, predators
+
+def save_simulation(path, fishes, predators, extra=None, extra_params=None):
+    arrays, params = snapshot_state(fishes, predators)
+    arrays.update(extra or {})
+    params.update(extra_params or {})
+    save_checkpoint(path, arrays, params)
+    logging.info(f"Checkpoint saved as {path}")
+
+def load_simulation(path):
+    """Return (fishes, predators, arrays, params) and restore the RNG state."""
+    arrays, params, rng = load_checkpoint(path)
+    if (params['width'], params['height']) != (WIDTH, HEIGHT):
+        raise ValueError(f"Checkpoint {path} was saved for a {params['width']}x{params['height']} tank")
+    table = MIXED_SPECIES if params.get('mixed_species_enabled') else SINGLE_SPECIES
+    fishes, predators = restore_state(arrays, table)
+    set_rng_state(rng)
+    logging.info(f"Checkpoint loaded from {path} ({len(fishes)} fish, {len(predators)} predators)")
+    return fishes, predators, arrays, params
+
+def warm_start_path():
+    return os.path.join(CHECKPOINT_DIR, f"warm_{fish_count}_{int(boundary_behavior_enabled)}"
+                                        f"{int(predators_enabled)}{int(obstacles_enabled)}"
+                                        f"{int(open_population_enabled)}{int(mixed_species_enabled)}.npz")
+
+def warm_start():
+    """Return a settled school, running the burn-in headless once per configuration."""
+    path = warm_start_path()
+    if os.path.exists(path):
+        try:
+            fishes, predators, _, _ = load_simulation(path)
+            return fishes, predators
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable warm start checkpoint {path}: {e}")
+
+    logging.info(f"Running {WARM_START_STEPS} burn-in steps for warm start")
+    fishes = create_fish(fish_count)
+    predators = create_predators(predator_count) if predators_enabled else []
+    obstacles = create_obstacles() if obstacles_enabled else None
+    for _ in range(WARM_START_STEPS):
+        step_simulation(fishes, predators, obstacles)
+    save_simulation(path, fishes, predators)
+    return fishes, predators
+
+def seed_rng(seed):
+    random.seed(seed)
+    np.random.seed(seed)
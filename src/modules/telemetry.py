@@ -0,0 +1,289 @@
+"""Live telemetry over a local TCP or Unix socket.
+
+Every message is a 5 byte header, `<BI` (kind, payload length), followed by
+the payload:
+
+- MSG_HELLO: UTF-8 JSON with the protocol version, tank size and settings,
+  sent once when a client connects.
+- MSG_METRICS: `<IIffff` frame, fish count, step time (ms) and the mean,
+  standard deviation and maximum of the fish count per density cell.
+- MSG_POSITIONS: `<II` frame and point count, then that many (x, y) uint16
+  pairs. Sent every `frame_interval` steps, with at most `max_points` fish.
+
+The server runs an asyncio loop in a background thread. Each client has a
+small queue, and only a few KB of it are handed to the socket at a time; when
+a client reads too slowly its oldest queued messages are dropped, so the
+simulation never waits for a client and the client stays near the latest
+frames. Clients should also keep their own receive buffers small. Run this
+module to start a stand-in client that prints what it receives.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+
+import numpy as np
+
+TELEMETRY_VERSION = 1
+DEFAULT_ADDRESS = '127.0.0.1:8765'
+DENSITY_CELL = 50
+# Bytes a slow client may have in flight in the transport and the kernel send
+# buffer; anything beyond waits in its queue, where newer messages replace it
+WRITE_BUFFER_LIMIT = 1024
+SEND_BUFFER_SIZE = 4096
+
+MSG_HELLO = 0
+MSG_METRICS = 1
+MSG_POSITIONS = 2
+
+HEADER = struct.Struct('<BI')
+METRICS = struct.Struct('<IIffff')
+POSITIONS = struct.Struct('<II')
+
+
+def parse_address(address):
+    """Return ('unix', path) for 'unix:/path', else ('tcp', (host, port)) for 'host:port' or 'port'."""
+    if address.startswith('unix:'):
+        return 'unix', address[len('unix:'):]
+    host, _, port = address.rpartition(':')
+    return 'tcp', (host or '127.0.0.1', int(port))
+
+
+def density_stats(positions, width, height, cell=DENSITY_CELL):
+    """Mean, standard deviation and maximum of the fish count per grid cell."""
+    cols, rows = width // cell, height // cell
+    cells = (positions // cell).astype(np.int64)
+    inside = (cells[:, 0] >= 0) & (cells[:, 0] < cols) & (cells[:, 1] >= 0) & (cells[:, 1] < rows)
+    counts = np.bincount(cells[inside, 1] * cols + cells[inside, 0], minlength=rows * cols)
+    return float(counts.mean()), float(counts.std()), float(counts.max())
+
+
+def encode_message(kind, payload):
+    return HEADER.pack(kind, len(payload)) + payload
+
+
+def encode_metrics(frame, fish_count, step_ms, density):
+    return encode_message(MSG_METRICS, METRICS.pack(frame, fish_count, step_ms, *density))
+
+
+def encode_positions(frame, positions, max_points):
+    # Evenly strided subset of the school, quantized to whole pixels
+    stride = max(1, -(-len(positions) // max_points))
+    points = np.clip(positions[::stride], 0, 65535).astype('<u2')
+    return encode_message(MSG_POSITIONS, POSITIONS.pack(frame, len(points)) + points.tobytes())
+
+
+def decode_message(kind, payload):
+    """Turn a message payload into a dict; unknown kinds are returned raw."""
+    if kind == MSG_HELLO:
+        return dict(json.loads(payload.decode('utf-8')), kind='hello')
+    if kind == MSG_METRICS:
+        frame, fish_count, step_ms, mean, std, peak = METRICS.unpack(payload)
+        return {'kind': 'metrics', 'frame': frame, 'fish_count': fish_count, 'step_ms': step_ms,
+                'density_mean': mean, 'density_std': std, 'density_max': peak}
+    if kind == MSG_POSITIONS:
+        frame, count = POSITIONS.unpack_from(payload)
+        points = np.frombuffer(payload, dtype='<u2', count=2 * count, offset=POSITIONS.size).reshape(-1, 2)
+        return {'kind': 'positions', 'frame': frame, 'positions': points}
+    return {'kind': kind, 'payload': payload}
+
+
+async def read_message(reader):
+    """Read one (kind, payload) message, or return None once the server closes."""
+    try:
+        kind, length = HEADER.unpack(await reader.readexactly(HEADER.size))
+        return kind, await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        return None
+
+
+async def open_connection(address, limit=2 ** 16):
+    # `limit` bounds how much the StreamReader reads ahead of the consumer
+    kind, target = parse_address(address)
+    if kind == 'unix':
+        return await asyncio.open_unix_connection(target, limit=limit)
+    return await asyncio.open_connection(*target, limit=limit)
+
+
+class TelemetryClient:
+    """Server-side state of one connected client."""
+
+    def __init__(self, writer, queue_size):
+        self.writer = writer
+        self.queue = collections.deque(maxlen=queue_size)
+        self.ready = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0
+
+    def push(self, message):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1  # The deque discards the oldest message
+        self.queue.append(message)
+        self.ready.set()
+
+
+class TelemetryServer:
+    """Streams per-step metrics and position frames to local clients.
+
+    `start` binds the socket and serves from a background thread; the
+    simulation calls `publish_step` after each step, which returns immediately
+    and does no work while no client is connected.
+    """
+
+    def __init__(self, width, height, address=DEFAULT_ADDRESS, queue_size=16, frame_interval=6, max_points=2000):
+        self.width = width
+        self.height = height
+        self.address = address
+        self.queue_size = queue_size
+        self.frame_interval = frame_interval
+        self.max_points = max_points
+        self.clients = set()
+        self.loop = None
+        self.thread = None
+        self._server = None
+        self._error = None
+
+    def start(self):
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(started,), name='telemetry', daemon=True)
+        self.thread.start()
+        started.wait()
+        if self._error is not None:
+            self.thread.join()
+            raise self._error
+        logging.info(f"Telemetry server listening on {self.address}")
+
+    def close(self, timeout=5):
+        if self.thread is None or not self.thread.is_alive():
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout)
+
+    def publish_step(self, frame, fishes, step_ms):
+        """Queue the metrics of a finished step, and a position frame every frame_interval steps."""
+        if not self.clients:
+            return
+        positions = np.array([(fish.pos.x, fish.pos.y) for fish in fishes], dtype=np.float32).reshape(-1, 2)
+        density = density_stats(positions, self.width, self.height)
+        messages = [encode_metrics(frame, len(positions), step_ms, density)]
+        if frame % self.frame_interval == 0:
+            messages.append(encode_positions(frame, positions, self.max_points))
+        self.loop.call_soon_threadsafe(self._broadcast, messages)
+
+    def _broadcast(self, messages):
+        for client in self.clients:
+            for message in messages:
+                client.push(message)
+
+    def _run(self, started):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self._server = self.loop.run_until_complete(self._listen())
+        except OSError as e:
+            self._error = e
+            self.loop.close()
+            started.set()
+            return
+        started.set()
+        self.loop.run_forever()
+
+        self._server.close()
+        tasks = asyncio.all_tasks(self.loop)
+        for task in tasks:
+            task.cancel()
+        self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        self.loop.close()
+        kind, target = parse_address(self.address)
+        if kind == 'unix' and os.path.exists(target):
+            os.remove(target)
+
+    async def _listen(self):
+        kind, target = parse_address(self.address)
+        if kind == 'unix':
+            if os.path.exists(target):
+                os.remove(target)  # Stale socket from a previous run
+            return await asyncio.start_unix_server(self._handle, path=target)
+        return await asyncio.start_server(self._handle, *target)
+
+    async def _handle(self, reader, writer):
+        client = TelemetryClient(writer, self.queue_size)
+        transport = writer.transport
+        transport.set_write_buffer_limits(high=WRITE_BUFFER_LIMIT, low=0)
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER_SIZE)
+        self.clients.add(client)
+        peer = writer.get_extra_info('peername') or 'unix socket'
+        logging.info(f"Telemetry client connected: {peer}")
+        hello = {'version': TELEMETRY_VERSION, 'width': self.width, 'height': self.height,
+                 'density_cell': DENSITY_CELL, 'frame_interval': self.frame_interval,
+                 'max_points': self.max_points}
+        client.push(encode_message(MSG_HELLO, json.dumps(hello).encode('utf-8')))
+        try:
+            while True:
+                await client.ready.wait()
+                client.ready.clear()
+                while client.queue:
+                    if transport.get_write_buffer_size() > WRITE_BUFFER_LIMIT:
+                        # Waiting here only holds back this client; new messages keep
+                        # replacing the oldest ones in its queue meanwhile
+                        await writer.drain()
+                        continue
+                    writer.write(client.queue.popleft())
+                    client.sent += 1
+        except (ConnectionError, OSError, asyncio.CancelledError):
+            # Cancelled when the server closes; returning normally keeps
+            # asyncio from reporting the handler task as failed
+            pass
+        finally:
+            self.clients.discard(client)
+            writer.close()
+            logging.info(f"Telemetry client disconnected: {peer} "
+                         f"({client.sent} messages sent, {client.dropped} dropped)")
+
+
+async def run_client(address, delay=0.0, limit=None):
+    """Stand-in client: print every message, optionally reading slowly."""
+    # Small read-ahead and receive buffers keep a slow reader close to the latest frames
+    reader, writer = await open_connection(address, limit=WRITE_BUFFER_LIMIT)
+    writer.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SEND_BUFFER_SIZE)
+    received = 0
+    try:
+        while limit is None or received < limit:
+            message = await read_message(reader)
+            if message is None:
+                break
+            message = decode_message(*message)
+            received += 1
+            if message['kind'] == 'metrics':
+                print(f"frame {message['frame']:6d}  fish {message['fish_count']:6d}  "
+                      f"step {message['step_ms']:7.2f} ms  density mean {message['density_mean']:.2f} "
+                      f"std {message['density_std']:.2f} max {message['density_max']:.0f}")
+            elif message['kind'] == 'positions':
+                print(f"frame {message['frame']:6d}  positions: {len(message['positions'])} points")
+            else:
+                print(message)
+            if delay:
+                await asyncio.sleep(delay)
+    finally:
+        writer.close()
+    return received
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Print Fishband telemetry")
+    parser.add_argument('address', nargs='?', default=DEFAULT_ADDRESS, help="host:port or unix:/path")
+    parser.add_argument('--delay', type=float, default=0.0,
+                        help="seconds to wait after each message, to act as a slow consumer")
+    parser.add_argument('--count', type=int, default=None, help="stop after this many messages")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_client(args.address, args.delay, args.count))
+    except KeyboardInterrupt:
+        pass